@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the hot paths of the ecobee and climate packages on synthetic data.
+
+Run from the repository root:
+    python -m benchmarks.run --help
+"""
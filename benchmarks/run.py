@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark runner. Each case is timed (best of some repetitions) and its peak memory is
+measured with tracemalloc in a separate run, for several data sizes. The results can be
+saved as a baseline and later runs are compared against it: a case is a regression if its
+time or peak memory grew more than the tolerance.
+
+Usage from the repository root:
+    python -m benchmarks.run --save                  # measure and store the baseline
+    python -m benchmarks.run                         # measure and compare with the baseline
+    python -m benchmarks.run --cases getDataFrame --sizes small medium
+"""
+
+import os
+import json
+import tracemalloc
+
+from . import synthetic
+
+defaultBaseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# days of each report, years of each station and devices of the metadata for each size
+sizes = {'small':  {'days': 30,   'years': 10, 'devices': 1000},
+         'medium': {'days': 365,  'years': 30, 'devices': 10000},
+         'large':  {'days': 1095, 'years': 60, 'devices': 100000}}
+
+def reportPath(workDir, size, part = 0, comments = 0, malformed = 0):
+    '''
+    Description: It returns the path of a synthetic report, writing it the first time.
+    '''
+    days = sizes[size]['days']
+    path = os.path.join(workDir, 'report_%s_%d_%d_%d.csv' % (size, part, comments, malformed))
+    if not os.path.exists(path):
+        start = str(2015 + part * (days // 365 + 1)) + '-01-01'
+        synthetic.ecobeeReport(path, days, start = start, seed = part, comments = comments, malformed = malformed)
+    return path
+
+def loadedData(workDir, size):
+    '''
+    Description: It returns an ecobeeData object with a synthetic report loaded.
+    '''
+    from ecobee import preprocessing as pp
+    
+    ecobee = pp.ecobeeData(cache = False)
+    ecobee.append(reportPath(workDir, size))
+    return ecobee
+
+# Each case receives the data directory and the size and returns (function to be measured, rows processed).
+
+def caseGetDataFrame(workDir, size):
+    from ecobee import preprocessing as pp
+    
+    path = reportPath(workDir, size)
+    ecobee = pp.ecobeeData(cache = False)
+    return (lambda: ecobee.getDataFrame(path)), sizes[size]['days'] * 288
+
+def caseGetDataFrameMalformed(workDir, size):
+    from ecobee import preprocessing as pp
+    
+    days = sizes[size]['days']
+    path = reportPath(workDir, size, comments = days, malformed = days // 10 + 1)
+    ecobee = pp.ecobeeData(cache = False)
+    return (lambda: ecobee.getDataFrame(path)), days * 288
+
+def caseAppend(workDir, size):
+    from ecobee import preprocessing as pp
+    
+    paths = [reportPath(workDir, size, part) for part in range(3)]
+    def append():
+        ecobee = pp.ecobeeData(cache = False)
+        for path in paths:
+            ecobee.append(path)
+        return ecobee
+    return append, 3 * sizes[size]['days'] * 288
+
+def caseSummarizeData(workDir, size):
+    ecobee = loadedData(workDir, size)
+    return ecobee.summarizeData, ecobee.data.shape[0]
+
+def caseGetTimeOn(workDir, size):
+    ecobee = loadedData(workDir, size)
+    return ecobee.getTimeOn, ecobee.data.shape[0]
+
+def caseGetHeatwave(workDir, size):
+    from climate import heatwaveFinder as hw
+    
+    data = synthetic.stationSeries(sizes[size]['years'])
+    return (lambda: hw.get_heatwave(data, 'flag', 'hw', min_tmp_name = 'MIN_N_AIRTMP_MED10', 
+                                    max_tmp_name = 'MAX_N_AIRTMP_MED10')), data.shape[0]
+
+def caseMetaDataSelect(workDir, size):
+    from ecobee import metadata as md
+    
+    path = os.path.join(workDir, 'meta_data_%s.csv' % size)
+    if not os.path.exists(path):
+        synthetic.metaDataTable(path, sizes[size]['devices'])
+    metadata = md.metaData(path)
+    def select():
+        # the index of the column is built on the first select
+        metadata.dropIndexes()
+        return metadata.select(md.provStateCol, 'ON')
+    return select, metadata.data.shape[0]
+
+cases = {'getDataFrame':          caseGetDataFrame,
+         'getDataFrame-malformed': caseGetDataFrameMalformed,
+         'append':                caseAppend,
+         'summarizeData':         caseSummarizeData,
+         'getTimeOn':             caseGetTimeOn,
+         'get_heatwave':          caseGetHeatwave,
+         'metaData.select':       caseMetaDataSelect}
+
+def measure(function, repeat = 3):
+    '''
+    Description: 
+        It measures a function. Fast functions are run many times in each timed run (like timeit),
+        so their time is stable enough to be compared.
+    Input:
+        function: A function without arguments.
+        repeat: Number of timed runs.
+    Output:
+        A tuple (best wall time of one call in seconds, peak memory allocated during one call in bytes).
+    '''
+    import timeit
+    
+    timer = timeit.Timer(function)
+    loops, seconds = timer.autorange()
+    best = min([seconds] + timer.repeat(repeat - 1, loops)) / loops
+    
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def runCases(workDir, names = tuple(cases), sizeNames = tuple(sizes), repeat = 3, progress = print):
+    '''
+    Description: It runs the benchmark cases.
+    Input:
+        workDir: The directory of the synthetic data. The files are reused between runs.
+        names: The names of the cases (keys of cases).
+        sizeNames: The sizes (keys of sizes).
+        repeat: Number of timed runs of each case.
+        progress: A function called with a line of text for each measure, or None.
+    Output:
+        A dictionary {case: {size: {'time': seconds, 'peak': bytes, 'rows': rows}}}. A case that
+        raised has {'error': message} instead.
+    '''
+    os.makedirs(workDir, exist_ok=True)
+    results = dict()
+    for name in names:
+        for size in sizeNames:
+            try:
+                function, rows = cases[name](workDir, size)
+                seconds, peak = measure(function, repeat)
+                result = {'time': seconds, 'peak': peak, 'rows': rows}
+                line = '%-24s %-7s %9d rows %9.4f s %8.1f MB %10.0f rows/s' % (name, size, rows, seconds, peak / 2**20, rows / seconds)
+            except Exception as e:
+                result = {'error': '%s: %s' % (type(e).__name__, e)}
+                line = '%-24s %-7s ERROR %s' % (name, size, result['error'])
+            results.setdefault(name, dict())[size] = result
+            if progress is not None:
+                progress(line)
+    return results
+
+def compare(results, baseline, tolerance = 0.25, minTime = 0.001, minPeak = 2**20):
+    '''
+    Description: It compares results of runCases with a baseline.
+    Input:
+        results, baseline: Outputs of runCases.
+        tolerance: Relative growth of time or peak memory accepted.
+        minTime, minPeak: Growths smaller than these (seconds and bytes) are taken as noise.
+    Output:
+        A list of messages, one for each regression. Cases missing from the baseline are not compared.
+    '''
+    regressions = list()
+    for name, bySize in results.items():
+        for size, result in bySize.items():
+            base = baseline.get(name, dict()).get(size)
+            if base is None:
+                continue
+            if 'error' in result and 'error' not in base:
+                regressions.append('%s %s: %s' % (name, size, result['error']))
+                continue
+            if 'error' in result or 'error' in base:
+                continue
+            for key, unit, scale, noise in [('time', 's', 1, minTime), ('peak', 'MB', 2**20, minPeak)]:
+                if result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > noise:
+                    regressions.append('%s %s: %s %.4f %s -> %.4f %s (+%.0f%%)' %
+                                       (name, size, key, base[key] / scale, unit, result[key] / scale, unit,
+                                        100 * (result[key] / base[key] - 1)))
+    return regressions
+
+def main(argv = None):
+    '''
+    Description: Command line entry point. Run with --help for the options.
+    '''
+    import sys
+    import argparse
+    import platform
+    import tempfile
+    
+    parser = argparse.ArgumentParser(description='Benchmark the ecobee and climate packages on synthetic data.')
+    parser.add_argument('--cases', nargs='+', default=list(cases), choices=list(cases))
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(sizes))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default=None, help='keep the synthetic data in this directory')
+    parser.add_argument('--baseline', default=defaultBaseline)
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+    
+    if args.data_dir is None:
+        with tempfile.TemporaryDirectory() as workDir:
+            results = runCases(workDir, args.cases, args.sizes, args.repeat)
+    else:
+        results = runCases(args.data_dir, args.cases, args.sizes, args.repeat)
+    
+    if args.save:
+        baseline = dict()
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)['results']
+        for name, bySize in results.items():
+            baseline.setdefault(name, dict()).update(bySize)
+        with open(args.baseline, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.platform(), 'results': baseline},
+                      file, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % args.baseline)
+        return
+    
+    if not os.path.exists(args.baseline):
+        print('No baseline at %s, run with --save to store one.' % args.baseline)
+        return
+    with open(args.baseline) as file:
+        baseline = json.load(file)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    if regressions:
+        sys.exit(1)
+    print('No regressions.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic data with the layout of the Ecobee Donate Your Data 2019 dataset and of the
+weather station series used by climate.heatwaveFinder. The values follow daily and yearly
+cycles with noise, so the summaries and heatwaves found on them look like real ones.
+"""
+
+import numpy as np
+import pandas as pd
+
+# columns of the ecobee reports, in the order of the real files
+reportCols = ['DateTime', 'System_Setting', 'HvacMode', 'Event', 'Schedule', 'T_ctrl', 'T_stp_cool', 'T_stp_heat', 
+              'Humidity', 'HumidityExpectedLow', 'HumidityExpectedHigh', 'auxHeat1', 'compCool1', 'compHeat1', 'fan', 
+              'Thermostat_Temperature', 'T_out', 'RH_out']
+
+hvacModes = ['off', 'heat', 'cool', 'auto']
+
+def ecobeeReport(path, days = 365, start = '2017-01-01', seed = 0, nanFraction = 0.01, comments = 0, malformed = 0):
+    '''
+    Description:
+        It writes a synthetic ecobee report with one row every 5 minutes. Temperatures are in
+        fahrenheit like in the real files.
+    Input:
+        path: The csv file path.
+        days: Number of days.
+        start: The first day.
+        seed: Seed of the random generator.
+        nanFraction: Fraction of missing values in each measurement.
+        comments: Number of comment ('#') and blank lines spread over the file.
+        malformed: Number of rows with missing or extra fields spread over the file.
+    Output:
+        The number of data rows.
+    '''
+    rng = np.random.default_rng(seed)
+    rows = days * 288
+    dateTime = pd.date_range(start, periods=rows, freq='5min')
+    hour = dateTime.hour.values + dateTime.minute.values / 60
+    yearDay = dateTime.dayofyear.values
+    
+    # outdoor temperature with yearly and daily cycles, fahrenheit
+    tOut = 50 - 25*np.cos(2*np.pi*(yearDay - 15)/365) - 8*np.cos(2*np.pi*(hour - 3)/24)
+    tOut = tOut + np.cumsum(rng.normal(0, 0.3, rows)) * 0.05 + rng.normal(0, 1, rows)
+    
+    # runs of modes: the mode changes on about 10% of the rows
+    modes = rng.choice(len(hvacModes), rows, p=[.55, .2, .2, .05])
+    change = rng.random(rows) < .1
+    change[0] = True
+    modes = modes[np.flatnonzero(change)[np.cumsum(change) - 1]]
+    
+    data = pd.DataFrame({'DateTime': dateTime.strftime('%Y-%m-%d %H:%M:%S'),
+                         'System_Setting': np.where(yearDay < 150, 'heat', 'cool'),
+                         'HvacMode': np.asarray(hvacModes, dtype=object)[modes],
+                         'Event': rng.choice(['', 'hold', 'smartAway', 'smartHome'], rows, p=[.7, .2, .05, .05]),
+                         'Schedule': rng.choice(['Home', 'Away', 'Sleep'], rows),
+                         'T_ctrl': np.round(69 + 3*rng.standard_normal(rows), 1),
+                         'T_stp_cool': 75.0,
+                         'T_stp_heat': 68.0,
+                         'Humidity': rng.integers(20, 60, rows).astype(float),
+                         'HumidityExpectedLow': 0,
+                         'HumidityExpectedHigh': 0,
+                         'auxHeat1': 0,
+                         'compCool1': np.where(modes == 2, 300, 0),
+                         'compHeat1': np.where(modes == 1, 300, 0),
+                         'fan': np.where(modes > 0, 300, 0),
+                         'Thermostat_Temperature': np.round(69 + 3*rng.standard_normal(rows), 1),
+                         'T_out': np.round(tOut, 1),
+                         'RH_out': rng.integers(10, 100, rows).astype(float)},
+                        columns=reportCols)
+    for column in ['Thermostat_Temperature', 'Humidity', 'T_out', 'RH_out']:
+        data.loc[rng.random(rows) < nanFraction, column] = np.nan
+    data.loc[rng.random(rows) < nanFraction, 'HvacMode'] = np.nan
+    
+    if comments == 0 and malformed == 0:
+        data.to_csv(path, index=False)
+        return rows
+    
+    # insert the bad lines after random data lines
+    lines = data.to_csv(index=False).split('\n')[:-1]
+    extra = dict()
+    for i in rng.integers(1, rows + 1, comments):
+        extra.setdefault(i, []).append(rng.choice(['# report generated by ecobee', '', '#']))
+    for i in rng.integers(1, rows + 1, malformed):
+        fields = lines[i].split(',')
+        if rng.random() < .5:
+            fields = fields[:len(fields)//2]
+        else:
+            fields = fields + ['', 'extra']
+        extra.setdefault(i, []).append(','.join(fields))
+    
+    with open(path, 'w') as file:
+        for i, line in enumerate(lines):
+            file.write(line + '\n')
+            for bad in extra.get(i, []):
+                file.write(bad + '\n')
+    return rows
+
+def stationSeries(years = 30, firstYear = 1981, seed = 0, nanFraction = 0, gapFraction = 0,
+                  day_name = 'DAY365', year_name = 'YEAR', min_tmp_name = 'MIN_N_AIRTMP_MED10', max_tmp_name = 'MAX_N_AIRTMP_MED10'):
+    '''
+    Description: It creates the daily series of a synthetic weather station, in celsius.
+    Input:
+        years: Number of years.
+        firstYear: The first year.
+        seed: Seed of the random generator.
+        nanFraction: Fraction of missing maximum temperatures.
+        gapFraction: Fraction of days left out of the series.
+        The other arguments are the column names.
+    Output:
+        A pandas data frame with one row for each day.
+    '''
+    rng = np.random.default_rng(seed)
+    day = np.tile(np.arange(1, 366), years)
+    year = np.repeat(np.arange(firstYear, firstYear + years), 365)
+    rows = len(day)
+    
+    # seasonal cycle, a slow trend and autocorrelated anomalies, so there are warm spells
+    anomaly = np.zeros(rows)
+    noise = rng.normal(0, 1.5, rows)
+    for k in range(1, rows):
+        anomaly[k] = 0.7*anomaly[k-1] + noise[k]
+    maxTmp = 25 + 8*np.sin(2*np.pi*(day - 100)/365) + 0.02*(year - firstYear) + anomaly
+    minTmp = maxTmp - 10 + rng.normal(0, 1, rows)
+    
+    data = pd.DataFrame({year_name: year, day_name: day,
+                         max_tmp_name: np.round(maxTmp, 1), min_tmp_name: np.round(minTmp, 1)})
+    if nanFraction > 0:
+        data.loc[rng.random(rows) < nanFraction, max_tmp_name] = np.nan
+    if gapFraction > 0:
+        data = data[rng.random(rows) >= gapFraction].reset_index(drop=True)
+    return data
+
+def metaDataTable(path, devices = 10000, seed = 0):
+    '''
+    Description: It writes a synthetic meta_data.csv with the columns of ecobee.metadata.
+    Input:
+        path: The csv file path.
+        devices: Number of devices.
+        seed: Seed of the random generator.
+    Output:
+        A list with the device identifiers.
+    '''
+    from ecobee import metadata as md
+    
+    rng = np.random.default_rng(seed)
+    ids = ['%040x' % k for k in rng.integers(0, 2**62, devices)]
+    states = ['ON', 'QC', 'BC', 'AB', 'CA', 'TX', 'NY', 'IL', 'FL', 'WA']
+    data = pd.DataFrame({md.dataIdCol: ids,
+                         md.countryCol: rng.choice(['CA', 'US'], devices),
+                         md.provStateCol: rng.choice(states, devices),
+                         md.cityCol: rng.choice(['City%d' % k for k in range(500)], devices),
+                         md.modelCol: rng.choice(['ecobee3', 'ecobee3 lite', 'ecobee4', 'SmartSi'], devices),
+                         md.plcStyleCol: rng.choice(['Detached', 'Apartment', 'Townhouse'], devices),
+                         md.areaCol: rng.integers(500, 5000, devices),
+                         md.plcAgeCol: rng.integers(0, 100, devices),
+                         md.occpNumCol: rng.integers(1, 6, devices),
+                         md.remSenNumCol: rng.integers(0, 5, devices)})
+    data.to_csv(path, index=False)
+    return ids
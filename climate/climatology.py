@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Percentile climatology tables for heatwave detection.
+
+For a fixed baseline period, the heatwave threshold of a day depends only on the station and
+the calendar day, so it can be computed once and reused by get_heatwave(climatology = table).
+The tables are cached on disk (Feather files, or csv without pyarrow), keyed by the hash of the baseline data and of the parameters,
+so a cached table is used again only while the baseline data doesn't change.
+"""
+
+import os
+
+import pandas as pd
+
+from . import heatwaveFinder as hwf
+
+defaultCacheDir = os.path.join(os.path.expanduser('~'), '.cache', 'climate')
+
+def threshold_name(percentile, kind):
+    '''
+    Input:
+        percentile: the value of the percentile.
+        kind: 'max' or 'min'.
+    Output:
+        The name of the column of the threshold in a climatology table, like 'p90_max'.
+    '''
+    return 'p%g_%s' % (percentile, kind)
+
+def baseline_data(data, baseline = None, year_name = 'YEAR'):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        baseline: A tuple (first year, last year), both inclusive, or None to use all the data.
+        year_name: The name of the column that contains the years.
+    Output:
+        It returns the rows of the baseline period.
+    '''
+    if baseline is None:
+        return data
+    return data[(data[year_name] >= baseline[0]) & (data[year_name] <= baseline[1])]
+
+def build_climatology(data, percentiles = (90,), baseline = None, day_name = 'DAY365', year_name = 'YEAR',
+                      min_tmp_name = None, max_tmp_name = None, key = None, window = 15):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        percentiles: The values of the percentiles.
+        baseline: A tuple (first year, last year) of the baseline period, or None to use all the data.
+        day_name: The name of the column that contains the calendar days.
+        year_name: The name of the column that contains the years.
+        min_tmp_name: The name of the column that contains the air min temperatures, or None.
+        max_tmp_name: The name of the column that contains the air max temperatures, or None.
+        key: The name of the column that identifies each station, or None for a single station.
+        window: How many days before and after each day are used.
+    Output:
+        It returns a Pandas Data Frame with one row for each station and calendar day, with the columns
+        key (if passed), day_name and the thresholds 'p<p>_max' and/or 'p<p>_min' for each percentile p.
+        The thresholds are the same get_heatwave computes from the baseline data.
+    '''
+    base = baseline_data(data, baseline, year_name)
+    kinds = [(name, kind) for name, kind in [(max_tmp_name, 'max'), (min_tmp_name, 'min')] if name is not None]
+    
+    groups = base.groupby(key, sort=False) if key is not None else [(None, base)]
+    tables = list()
+    for station, series in groups:
+        pcts = hwf.window_percentiles(series, [name for name, _ in kinds], list(percentiles), day_name, window)
+        table = pd.DataFrame({day_name: pcts[kinds[0][0]].index})
+        if key is not None:
+            table.insert(0, key, station)
+        for name, kind in kinds:
+            for p in percentiles:
+                table[threshold_name(p, kind)] = pcts[name][p].values
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+def climatology_key(data, percentiles, baseline, day_name, year_name, min_tmp_name, max_tmp_name, key, window):
+    '''
+    Output:
+        It returns the hash of the baseline data and of the parameters of build_climatology.
+    '''
+    import hashlib
+    
+    base = baseline_data(data, baseline, year_name)
+    columns = [c for c in [key, year_name, day_name, min_tmp_name, max_tmp_name] if c is not None and c in base.columns]
+    
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((list(percentiles), baseline, day_name, year_name, min_tmp_name, max_tmp_name, key, window)).encode())
+    digest.update(pd.util.hash_pandas_object(base[columns], index=False).values.tobytes())
+    return digest.hexdigest()
+
+def load_climatology(data, percentiles = (90,), baseline = None, day_name = 'DAY365', year_name = 'YEAR',
+                     min_tmp_name = None, max_tmp_name = None, key = None, window = 15, cache_dir = None):
+    '''
+    Input:
+        cache_dir: Where the tables are kept. If None, it will be used $CLIMATE_CACHE_DIR or ~/.cache/climate.
+        The other arguments are the same of build_climatology.
+    Output:
+        It returns the climatology table from the disk cache, or builds and stores it if the baseline 
+        data or the parameters changed.
+    '''
+    if cache_dir is None:
+        cache_dir = os.environ.get('CLIMATE_CACHE_DIR', defaultCacheDir)
+    
+    try:
+        import pyarrow.feather
+        ext = '.feather'
+    except ImportError:
+        ext = '.csv'
+    
+    name = climatology_key(data, percentiles, baseline, day_name, year_name, min_tmp_name, max_tmp_name, key, window)
+    path = os.path.join(cache_dir, name + ext)
+    if os.path.exists(path):
+        if ext == '.feather':
+            return pd.read_feather(path)
+        # keep the type of the key, so station ids like '007' still match the data
+        return pd.read_csv(path, dtype={key: data[key].dtype} if key is not None else None)
+    
+    table = build_climatology(data, percentiles, baseline, day_name, year_name, min_tmp_name, max_tmp_name, key, window)
+    os.makedirs(cache_dir, exist_ok=True)
+    if ext == '.feather':
+        table.to_feather(path + '.tmp')
+    else:
+        table.to_csv(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return table
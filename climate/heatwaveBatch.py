@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch heatwave detection for many weather stations or thermostats at once.
+
+The input is a long-format data frame with one series for each value of a key column
+(a station or a device identifier). Each series is labeled by heatwaveFinder.get_heatwave
+in parallel worker processes.
+"""
+
+import pandas as pd
+
+from . import heatwaveFinder as hwf
+
+def heatwave_events(data, hw_name, tmp_name, day_name = 'DAY365', key = None, year_name = 'YEAR'):
+    '''
+    Input:
+        data: Pandas Data Frame Object returned by get_heatwave or get_heatwave_batch.
+        hw_name: The name of the column that contains the labels for each heatwave.
+        tmp_name: The name of the column with the temperatures of the index (max or min).
+        day_name: The name of the column that contains the days.
+        key: The name of the column that identifies each series, or None for a single series.
+        year_name: The name of the column that contains the years, or None.
+    Output:
+        It returns a Pandas Data Frame with one row for each heatwave and the columns: key (if passed),
+        hw_name, year_name (the year of its first day, if the column exists), 'start' and 'end' (first 
+        and last day), 'duration' (number of days) and 'peak' (highest temperature of the heatwave).
+        A heatwave that goes into the next year ends on a day smaller than its start.
+    '''
+    groups = ([key] if key is not None else []) + [hw_name]
+    hw = data[data[hw_name] > 0].reset_index(drop=True)
+    hw = hw.assign(_day = hwf.day_ordinals(hw, day_name, year_name))
+    
+    grouped = hw.groupby(groups, sort=False)
+    first = hw.loc[grouped['_day'].idxmin()].set_index(groups)
+    last = hw.loc[grouped['_day'].idxmax()].set_index(groups)
+    events = pd.DataFrame({'start': first[day_name],
+                           'end': last[day_name],
+                           'duration': grouped['_day'].nunique(),
+                           'peak': grouped[tmp_name].max()})
+    if year_name is not None and year_name in hw.columns:
+        events.insert(0, year_name, first[year_name])
+    return events.reset_index()
+
+def label_series(args):
+    '''
+    Input:
+        args: A tuple (data frame of one series, keyword arguments of get_heatwave).
+    Output:
+        It returns the data frame labeled by get_heatwave. It runs in the worker processes.
+    '''
+    data, kwargs = args
+    return hwf.get_heatwave(data, **kwargs)
+
+def get_heatwave_batch(data, key, flag, hw_name = 'none', index = 'CTX90pct', percentile = 90,
+                       day_name = 'DAY365', year_name = 'YEAR', min_tmp_name = None, max_tmp_name = None,
+                       climatology = None, workers = None):
+    '''
+    Input:
+        data: Pandas Data Frame Object with many series in long format. Every row must have a key.
+        key: The name of the column that identifies each series (station or device).
+        climatology: A table from climate.climatology built with the same key, or None. It must have every station of data.
+        workers: Number of worker processes. If None, it uses one per CPU. If 1, the series are processed serially.
+        The other arguments are the same of get_heatwave and are applied to every series.
+    Output:
+        It returns a tuple with:
+            the data frame with the columns added by get_heatwave, in the same row order as data;
+            the heatwave events of all series (see heatwave_events).
+    '''
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    
+    if index not in ('CTX90pct', 'CTN90pct'):
+        raise ValueError('You should pass a valid index (CTX90pct or CTN90pct)')
+    
+    if data[key].isna().any():
+        raise ValueError('%d rows have no %s' % (data[key].isna().sum(), key))
+    
+    kwargs = dict(flag = flag, hw_name = hw_name, index = index, percentile = percentile, day_name = day_name,
+                  year_name = year_name, min_tmp_name = min_tmp_name, max_tmp_name = max_tmp_name)
+    # the series are labeled with the row positions as index, to put the rows back in order after
+    series = list(data.reset_index(drop=True).groupby(key, sort=False))
+    tables = dict()
+    if climatology is not None:
+        tables = dict(list(climatology.groupby(key, sort=False)))
+        missing = [station for station, _ in series if station not in tables]
+        if missing:
+            raise KeyError('the climatology has no table for %s' % ', '.join(map(str, missing[:10])))
+    tasks = [(rows, dict(kwargs, climatology = tables.get(station))) for station, rows in series]
+    
+    if workers == 1 or len(tasks) < 2:
+        results = [label_series(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            # a few series for each task so small series don't cost a round trip each
+            chunk = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+            results = list(pool.map(label_series, tasks, chunksize=chunk))
+    
+    labeled = pd.concat(results).sort_index()
+    labeled.index = data.index
+    
+    tmp_name = max_tmp_name if index == 'CTX90pct' else min_tmp_name
+    return labeled, heatwave_events(labeled, hw_name, tmp_name, day_name, key, year_name)
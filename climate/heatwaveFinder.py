@@ -8,6 +8,7 @@ Created on Sun Sep 22 17:55:20 2019
 
 import pandas as pd
 import numpy as np
+from contextlib import nullcontext
 
 def check_shape(data, day, day_name = 'DAY365'):
     '''
@@ -113,9 +114,182 @@ def init_hw(data,day,index = 'CTX90pct',min_tmp_name = 'MIN_N_AIRTMP_MED10', max
     else:
         return False
 
+def percentile_sorted(values, percentile):
+    '''
+    Input:
+        values: A sorted sequence of numbers without NaN.
+        percentile: the value of the percentile.
+    Output:
+        The percentile of the values, the same as np.percentile (linear method) returns.
+    '''
+    n = len(values)
+    virtual = (n - 1) * (percentile / 100)
+    if virtual >= n - 1:
+        return float(values[-1])
+    
+    previous = int(np.floor(virtual))
+    a, b = float(values[previous]), float(values[previous + 1])
+    t = virtual - previous
+    if t >= 0.5:
+        return b - (b - a) * (1 - t)
+    return a + (b - a) * t
+
+def window_percentiles(data, tmp_names, percentiles, day_name = 'DAY365', window = 15):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        tmp_names: A list with the names of the columns that contain temperatures.
+        percentiles: A list with the values of the percentiles.
+        day_name: The name of the column that contains the days.
+        window: How many days before and after each day are used.
+    Output:
+        It returns a dictionary mapping each temperature column to a Pandas Data Frame indexed by day
+        with one column for each percentile. See day_percentiles.
+        All columns and percentiles are computed in the same sweep over the days: each window is
+        built once and every percentile is read from it.
+    '''
+    from bisect import bisect_left, insort
+    
+    # distinct temperatures of each day, for each column
+    days = None
+    values = dict()
+    for tmp_name in tmp_names:
+        groups = data[[day_name, tmp_name]].drop_duplicates().groupby(day_name, sort=True)[tmp_name]
+        days = np.asarray(list(groups.groups.keys()))
+        values[tmp_name] = [np.asarray(v, dtype=np.float64) for _, v in groups]
+    
+    sorted_window = {tmp_name: [] for tmp_name in tmp_names}
+    nans = dict.fromkeys(tmp_names, 0)
+    result = {tmp_name: np.full((len(days), len(percentiles)), np.nan) for tmp_name in tmp_names}
+    lo = hi = 0
+    for i, d in enumerate(days):
+        # add the days up to d + window
+        while hi < len(days) and days[hi] <= d + window:
+            for tmp_name in tmp_names:
+                for v in values[tmp_name][hi]:
+                    if np.isnan(v):
+                        nans[tmp_name] += 1
+                    else:
+                        insort(sorted_window[tmp_name], v)
+            hi += 1
+        # remove the days before d - window
+        while days[lo] < d - window:
+            for tmp_name in tmp_names:
+                for v in values[tmp_name][lo]:
+                    if np.isnan(v):
+                        nans[tmp_name] -= 1
+                    else:
+                        del sorted_window[tmp_name][bisect_left(sorted_window[tmp_name], v)]
+            lo += 1
+        
+        for tmp_name in tmp_names:
+            if nans[tmp_name] == 0 and sorted_window[tmp_name]:
+                for j, percentile in enumerate(percentiles):
+                    result[tmp_name][i, j] = percentile_sorted(sorted_window[tmp_name], percentile)
+    
+    return {tmp_name: pd.DataFrame(result[tmp_name], index=days, columns=list(percentiles)) for tmp_name in tmp_names}
+
+def day_percentiles(data, tmp_name, percentile = 90, day_name = 'DAY365', window = 15):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        tmp_name: The name of the column that contains the temperatures.
+        percentile: the value of the percentile, or a list of them.
+        day_name: The name of the column that contains the days.
+        window: How many days before and after each day are used.
+    Output:
+        It returns a Pandas Series indexed by day with the percentile of the distinct temperatures of each
+        day from day - window to day + window. It is NaN if there is a NaN temperature in the window.
+        If a list of percentiles is passed, it returns a Pandas Data Frame with one column for each of them.
+        The window slides over the sorted days keeping its temperatures sorted, so each day costs O(log W).
+    '''
+    if np.ndim(percentile) == 0:
+        return window_percentiles(data, [tmp_name], [percentile], day_name, window)[tmp_name][percentile]
+    return window_percentiles(data, [tmp_name], list(percentile), day_name, window)[tmp_name]
+
+def day_ordinals(data, day_name = 'DAY365', year_name = 'YEAR'):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        day_name: The name of the column that contains the days of the year (1 is January 1st).
+        year_name: The name of the column that contains the years, or None.
+    Output:
+        It returns a numpy array with the day of each row counted from 1970-01-01, so the days of different
+        years don't overlap and December 31st is followed by January 1st. If there is no year column,
+        it returns the days of day_name.
+    '''
+    days = data[day_name].values
+    if year_name is None or year_name not in data.columns:
+        return days
+    years = data[year_name].values.astype(np.int64)
+    return (years - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64) + days.astype(np.int64) - 1
+
+def label_heatwaves(data, tmp_name, pct_name, day_name = 'DAY365', days = None):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        tmp_name: The name of the column that contains the temperatures.
+        pct_name: The name of the column that contains the percentile of each day.
+        day_name: The name of the column that contains the days, as integers.
+        days: The days of the rows as integers (see day_ordinals), used instead of day_name if passed.
+    Output:
+        It returns two numpy arrays with a value for each row: the flags (1 on heatwave days, 0 otherwise)
+        and the labels (a unique integer for each heatwave, 0 otherwise).
+        It evaluates the same rule as init_hw for all days at once: a day is on a heatwave if it and the 
+        2 days before have data, its max temperature is above the percentile, and so are the max temperatures
+        of the 2 days before or of the 2 days after. Heatwaves are runs of flagged days in order of appearance.
+    '''
+    days = data[day_name].values if days is None else np.asarray(days)
+    
+    # one value for each day, in order of appearance
+    first = ~pd.Index(days).duplicated()
+    day_max = data[tmp_name].groupby(days, sort=False).max()
+    has_nan = data[tmp_name].isna().groupby(days, sort=False).any()
+    exceed = (day_max.values >= data[pct_name].values[first]) & ~has_nan.values
+    
+    unique_days = days[first]
+    if not np.all(np.mod(unique_days, 1) == 0):
+        raise ValueError('%s must contain integer days' % day_name)
+    unique_days = unique_days.astype(np.int64)
+    
+    # dense arrays over the range of days, with 2 days of margin on each side
+    offset = int(unique_days.min()) - 2
+    pos = unique_days - offset
+    present = np.zeros(pos.max() + 3, dtype=bool)
+    above = np.zeros(pos.max() + 3, dtype=bool)
+    present[pos] = True
+    above[pos] = exceed
+    
+    back = above[pos - 1] & above[pos - 2]
+    forward = above[pos + 1] & above[pos + 2]
+    hit = present[pos - 1] & present[pos - 2] & above[pos] & (back | forward)
+    
+    # a new label for each run of flagged days
+    starts = hit & ~np.r_[False, hit[:-1]]
+    labels = np.where(hit, np.cumsum(starts), 0)
+    
+    where = pd.Index(unique_days).get_indexer(days)
+    return hit[where].astype(np.int64), labels[where].astype(np.int64)
+
+def stage(metrics, name, rows = 0):
+    '''
+    Input:
+        metrics: A stageMetrics object (see ecobee.metrics) or None.
+        name: The name of the stage.
+        rows: Number of rows processed.
+    Output:
+        A context manager that records the stage in metrics, or that does nothing if metrics is None.
+        Like ecobee.metrics.stage without the file argument, since these functions receive data frames,
+        and without importing ecobee, so this package doesn't depend on it.
+    '''
+    if metrics is None:
+        return nullcontext(dict())
+    return metrics.stage(name, rows = rows)
+
 # Function to actually get heatwaves
 def get_heatwave(data, flag, hw_name='none', index = 'CTX90pct',percentile = 90, 
-                 day_name = 'DAY365', year_name = 'YEAR',min_tmp_name = None, max_tmp_name = None):
+                 day_name = 'DAY365', year_name = 'YEAR',min_tmp_name = None, max_tmp_name = None, climatology = None,
+                 metrics = None):
     '''
     Input:
         data: Pandas Data Frame Object.
@@ -123,11 +297,15 @@ def get_heatwave(data, flag, hw_name='none', index = 'CTX90pct',percentile = 90,
         hw_name: The name of the column that will contain the labels for each heatwave.
         mean_tmp_name: The name of the column that contains the air mean temperatures.
         day_name: The name of the column that contains the days.
-        year_name: The name of the column that contains the years.
+        year_name: The name of the column that contains the years. The percentile of a calendar day is taken
+                   from all the years, and the heatwaves are searched on the days in order (see day_ordinals).
         min_tmp_name: The name of the column that contains the air min temperatures.
         max_tmp_name: The name of the column that contains the air max temperatures.
         percentile: the value of the percentile that will be used on the algorithm.
         index: Use 'CTX90pct' for maximum temperatures and 'CTN90pct' for minimum temperatures.
+        climatology: A table from climate.climatology (built with the same percentile and day_name). 
+                     If passed, the percentiles are taken from it instead of computed from data.
+        metrics: A stageMetrics object (see ecobee.metrics) that records the percentile and labelling stages, or None.
     Output:
         It returns a Pandas Data Frame with 3 new columns (flag column, hw_name column and 'Pencentil 90' column).
         For flag and hw_name colmuns, the days labeld with an integer greater than one denotes a heatwave.
@@ -142,59 +320,72 @@ def get_heatwave(data, flag, hw_name='none', index = 'CTX90pct',percentile = 90,
     # Create new columns on the data frame and iniate them with zeros.
     df[flag_heat] = 0
     df[flag_unique_heat] = 0
-
-    # Variable that labels unique heatwaves, each one of heatwaves will have a unique integer number
-    which_heat_wave = 1
-    new_hw = False
     
-    itera = iter(df[day_name].unique())
-
-    for d in itera:
-        # For each day there will be a different pct
-        df_pct = df[(df[day_name] >= d-15) & (df[day_name] <= d + 15)]
-        
-        # organize data to get the percentiles
-        max_t = []
-        min_t = []
+    # get the percentile of each day from the days around it or from the climatology
+    with stage(metrics, 'get_heatwave/percentiles', df.shape[0]):
         if index == 'CTX90pct':
-            df['p90_max'] = np.nan
-            for day in df_pct[day_name].unique():
-                mx = df_pct[df_pct[day_name] == day][max_tmp_name].unique()
-                max_t.append(mx)
-                
-            # get the percentile
-            pth_max = np.percentile(np.asarray(max_t), percentile)
-            # save percentiles
-            df.loc[(data[day_name] == d) , 'p90_max'] = pth_max
-            
+            if climatology is not None:
+                df['p90_max'] = df[day_name].map(climatology.set_index(day_name)['p%g_max' % percentile])
+            else:
+                df['p90_max'] = df[day_name].map(day_percentiles(df, max_tmp_name, percentile, day_name))
         elif index == 'CTN90pct':
-            df['p90_min'] = np.nan
-            for day in df_pct[day_name].unique():
-                mn = df_pct[df_pct[day_name] == day][min_tmp_name].unique()
-                min_t.append(mn)
-                
-            # get the percentile    
-            pth_min = np.percentile(np.asarray(min_t), percentile)
-            # save percentiles        
-            df.loc[(data[day_name] == d) , 'p90_min'] = pth_min
+            if climatology is not None:
+                df['p90_min'] = df[day_name].map(climatology.set_index(day_name)['p%g_min' % percentile])
+            else:
+                df['p90_min'] = df[day_name].map(day_percentiles(df, min_tmp_name, percentile, day_name))
         else:
             print('You should pass a valid index (CTX90pct or CTN90pct)')
             return
     
-    itera = iter(df[day_name].unique())
-    for d in itera:
-        
-        # verify if it was registered temperatures above the percentils
-        if init_hw(df,d,index = index,max_tmp_name = max_tmp_name, min_tmp_name = min_tmp_name, day_name = day_name):
-            
-            # label the heat wave encountered on the data frame
-            new_hw = True
-            df.loc[(df[day_name] == d) , flag_heat] = 1
-            df.loc[(data[day_name] == d) , flag_unique_heat] = which_heat_wave
+    # label the heatwaves encountered on the data frame
+    with stage(metrics, 'get_heatwave/label', df.shape[0]):
+        days = day_ordinals(df, day_name, year_name)
+        if index == 'CTX90pct':
+            df[flag_heat], df[flag_unique_heat] = label_heatwaves(df, max_tmp_name, 'p90_max', day_name, days)
         else:
-            if(new_hw == True):
-                which_heat_wave = which_heat_wave + 1
-                new_hw = False
-        # Fill the data frame with its percentils for each day.
+            df[flag_heat], df[flag_unique_heat] = label_heatwaves(df, min_tmp_name, 'p90_min', day_name, days)
             
-    return df
\ No newline at end of file
+    return df
+
+def get_heatwave_sweep(data, flag = 'flag', hw_name = 'hw', indices = ('CTX90pct', 'CTN90pct'), percentiles = (85, 90, 95),
+                       day_name = 'DAY365', year_name = 'YEAR', min_tmp_name = None, max_tmp_name = None, metrics = None):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        flag: The prefix of the names of the flag columns.
+        hw_name: The prefix of the names of the label columns.
+        indices: The indices to be evaluated ('CTX90pct' and/or 'CTN90pct').
+        percentiles: The values of the percentiles to be evaluated.
+        The other arguments are the same of get_heatwave (metrics included).
+    Output:
+        It returns a Pandas Data Frame with the same heatwaves get_heatwave would find for each index
+        and percentile, computed with a single sweep of the windows. For each index and percentile p
+        it adds the columns:
+            'p<p>_max' or 'p<p>_min': the percentile of each day;
+            '<flag>_<index>_<p>': the flags of the heatwave days;
+            '<hw_name>_<index>_<p>': the labels of the heatwaves.
+    '''
+    tmp_names = dict()
+    for index in indices:
+        if index == 'CTX90pct':
+            tmp_names[index] = (max_tmp_name, 'max')
+        elif index == 'CTN90pct':
+            tmp_names[index] = (min_tmp_name, 'min')
+        else:
+            print('You should pass a valid index (CTX90pct or CTN90pct)')
+            return
+    
+    df = data.copy()
+    columns = list(dict.fromkeys(tmp_name for tmp_name, _ in tmp_names.values()))
+    with stage(metrics, 'get_heatwave_sweep/percentiles', df.shape[0]):
+        pcts = window_percentiles(df, columns, list(percentiles), day_name)
+    
+    with stage(metrics, 'get_heatwave_sweep/label', df.shape[0] * len(tmp_names) * len(percentiles)):
+        days = day_ordinals(df, day_name, year_name)
+        for index, (tmp_name, suffix) in tmp_names.items():
+            for p in percentiles:
+                pct_name = 'p%g_%s' % (p, suffix)
+                df[pct_name] = df[day_name].map(pcts[tmp_name][p])
+                name = '_%s_%g' % (index, p)
+                df[flag + name], df[hw_name + name] = label_heatwaves(df, tmp_name, pct_name, day_name, days)
+    return df
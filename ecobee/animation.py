@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel headless rendering of the animated plots of ecobeeData.
+
+The frames are split into contiguous segments, each segment is rendered by a worker process on
+the Agg backend and its raw RGB frames are piped to ffmpeg. The encoded segments are then joined
+by ffmpeg without re-encoding (mp4) or converted to a GIF with a palette computed from all frames.
+The ffmpeg executable is the one configured for matplotlib (rcParams['animation.ffmpeg_path']).
+"""
+
+import os
+
+class slidingScene:
+    
+    def __init__(self, t, y1, y2, step, y1label = "", y2label = "", xlabel = "", ylabel = "", title = "", figsize = (24,16), lod = 'minmax'):
+        '''
+        Description:
+            The scene of ecobeeData.animatedPlot: a window of step points of each measurement
+            that moves one point for each frame.
+        Input:
+            t, y1, y2: numpy arrays with the x values and the two measurements.
+            step: The number of points of the window.
+            lod: Level of detail of the lines (see ecobee.downsample.lodIndices).
+            The other arguments are the labels and size of the plot.
+        '''
+        self.t, self.y1, self.y2, self.step = t, y1, y2, step
+        self.labels = (y1label, y2label, xlabel, ylabel, title)
+        self.figsize = figsize
+        self.lod = lod
+    
+    def setup(self):
+        '''
+        Description: It creates the figure of the scene on the Agg backend.
+        Output:
+            The matplotlib figure.
+        '''
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from .downsample import axesWidth
+        
+        y1label, y2label, xlabel, ylabel, title = self.labels
+        step = self.step
+        
+        self.fig = Figure(figsize = self.figsize)
+        FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot(1, 1, 1)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        
+        # the first window sets the y limits to the range of the whole series
+        k = self.y1[:step].copy()
+        k[0], k[-1] = self.y1.max(), self.y1.min()
+        l = self.y2[:step].copy()
+        l[0], l[-1] = self.y2.max(), self.y2.min()
+        
+        self.lines = [ax.plot(self.t[:step], k, 'darkblue', label = y1label)[0],
+                      ax.plot(self.t[:step], l, 'lime', label = y2label)[0]]
+        ax.legend(loc='lower right')
+        ax.set_title(title)
+        self.width = axesWidth(ax)
+        return self.fig
+    
+    def start(self, frame):
+        '''
+        Description: It prepares the scene to render from the frame passed.
+        '''
+        self.fig.canvas.draw()
+    
+    def draw(self, i):
+        '''
+        Description: It updates the scene to the frame i.
+        '''
+        from .downsample import lodIndices
+        
+        step = self.step
+        if len(self.y1[i: i+step]) == step:
+            y1, y2 = self.y1[i:i + step], self.y2[i:i + step]
+            keep = lodIndices(self.t[:step], [y1, y2], self.width, self.lod)
+            self.lines[0].set_data(self.t[:step][keep], y1[keep])
+            self.lines[1].set_data(self.t[:step][keep], y2[keep])
+        self.fig.canvas.draw()
+
+class growingScene:
+    
+    def __init__(self, t, y1, y2, step, y1label = "", y2label = "", xlabel = "", ylabel = "", title = "", figsize = (24,16), lod = 'minmax'):
+        '''
+        Description:
+            The scene of ecobeeData.animatedPlotStatic: the lines of the two measurements grow
+            step points for each frame. Only the new points are drawn on each frame; the lines 
+            already drawn stay on the canvas.
+        Input:
+            t, y1, y2: numpy arrays with the x values and the two measurements.
+            step: How many points are added on each frame.
+            lod: Level of detail of the lines (see ecobee.downsample.lodIndices).
+            The other arguments are the labels and size of the plot.
+        '''
+        self.t, self.y1, self.y2, self.step = t, y1, y2, step
+        self.labels = (y1label, y2label, xlabel, ylabel, title)
+        self.figsize = figsize
+        self.lod = lod
+    
+    def setup(self):
+        '''
+        Description: It creates the figure of the scene on the Agg backend.
+        Output:
+            The matplotlib figure.
+        '''
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from .downsample import lodIndices, axesWidth
+        
+        y1label, y2label, xlabel, ylabel, title = self.labels
+        
+        self.fig = Figure(figsize = self.figsize)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(1, 1, 1)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        
+        # the points to be drawn and their positions in the whole series
+        self.keep = lodIndices(self.t, [self.y1, self.y2], axesWidth(self.ax), self.lod)
+        self.points = (self.t[self.keep], self.y1[self.keep], self.y2[self.keep])
+        t, y1, y2 = self.points
+        
+        # the whole lines set the limits, then they are emptied
+        self.lines = [self.ax.plot(t, y1, 'darkblue', label = y1label)[0],
+                      self.ax.plot(t, y2, 'lime', label = y2label)[0]]
+        self.legend = self.ax.legend(loc='lower right')
+        self.ax.set_title(title)
+        # fix the limits before emptying the lines
+        self.ax.set_xlim(self.ax.get_xlim())
+        self.ax.set_ylim(self.ax.get_ylim())
+        for line in self.lines:
+            line.set_data([], [])
+            line.set_animated(True)
+        return self.fig
+    
+    def start(self, frame):
+        '''
+        Description: It draws the background and the lines up to the frame passed.
+        '''
+        self.fig.canvas.draw()
+        self.drawn = 0
+        self.drawPoints(frame * self.step)
+    
+    def drawPoints(self, stop):
+        '''
+        Description: It draws the points of the whole series from the last one drawn up to stop over the canvas.
+        '''
+        import numpy as np
+        
+        stop = np.searchsorted(self.keep, stop)
+        start = max(self.drawn - 1, 0)
+        if stop > start:
+            t, y1, y2 = self.points
+            for line, y in zip(self.lines, [y1, y2]):
+                line.set_data(t[start:stop], y[start:stop])
+                self.ax.draw_artist(line)
+            self.ax.draw_artist(self.legend)
+        self.drawn = max(self.drawn, stop)
+    
+    def draw(self, i):
+        '''
+        Description: It updates the scene to the frame i.
+        '''
+        self.drawPoints(i * self.step)
+
+def ffmpegPath():
+    '''
+    Description: It returns the ffmpeg executable configured for matplotlib.
+    '''
+    import matplotlib
+    
+    return matplotlib.rcParams['animation.ffmpeg_path']
+
+def runFfmpeg(args, **kwargs):
+    '''
+    Description: It runs ffmpeg with the arguments passed and raises an error if it fails.
+    '''
+    import subprocess
+    
+    return subprocess.run([ffmpegPath(), '-y', '-loglevel', 'error'] + args, check=True, **kwargs)
+
+def renderSegment(scene, first, last, path, fps, codec):
+    '''
+    Description: It renders the frames [first, last) of a scene to a video file. It runs in the worker processes.
+    Input:
+        scene: A scene object (slidingScene or growingScene).
+        first, last: The range of frames.
+        path: The video file path.
+        fps: Frames per second.
+        codec: A list with the ffmpeg encoding arguments.
+    '''
+    import subprocess
+    import numpy as np
+    
+    fig = scene.setup()
+    width, height = fig.canvas.get_width_height()
+    
+    process = subprocess.Popen([ffmpegPath(), '-y', '-loglevel', 'error', 
+                                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '%dx%d' % (width, height), '-r', str(fps), 
+                                '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2'] + codec + [path],
+                               stdin=subprocess.PIPE)
+    try:
+        scene.start(first)
+        for i in range(first, last):
+            scene.draw(i)
+            process.stdin.write(np.asarray(fig.canvas.buffer_rgba())[:, :, :3].tobytes())
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError('ffmpeg failed to encode %s' % path)
+    return path
+
+def renderAnimation(scene, fileName, nFrames, fps = 30, workers = None, codec = ['-vcodec', 'libx264']):
+    '''
+    Description:
+        It renders a scene to a video file splitting the frames between worker processes. Each worker
+        renders a contiguous range of frames and the ranges are joined without re-encoding. 
+        If fileName ends with .gif, the frames are encoded without loss first and then converted to a GIF.
+    Input:
+        scene: A scene object (slidingScene or growingScene).
+        fileName: The video file path (.mp4, .gif, ...).
+        nFrames: Number of frames.
+        fps: Frames per second.
+        workers: Number of worker processes. If None, it uses one per CPU.
+        codec: A list with the ffmpeg encoding arguments of the video.
+    '''
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    
+    gif = fileName.lower().endswith('.gif')
+    if gif:
+        codec, ext = ['-vcodec', 'libx264rgb', '-qp', '0'], '.mkv'
+    else:
+        codec, ext = list(codec) + ['-pix_fmt', 'yuv420p'], os.path.splitext(fileName)[1]
+    
+    workers = workers or os.cpu_count() or 1
+    bounds = [nFrames * k // workers for k in range(workers + 1)]
+    segments = [(first, last) for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, 'segment%04d%s' % (k, ext)) for k in range(len(segments))]
+        args = [(scene, first, last, path, fps, codec) for (first, last), path in zip(segments, paths)]
+        if len(args) == 1:
+            renderSegment(*args[0])
+        else:
+            with ProcessPoolExecutor(len(args)) as pool:
+                list(pool.map(renderSegment, *zip(*args)))
+        
+        listing = os.path.join(tmp, 'segments.txt')
+        with open(listing, 'w') as file:
+            file.writelines("file '%s'\n" % path for path in paths)
+        
+        if gif:
+            joined = os.path.join(tmp, 'joined' + ext)
+            runFfmpeg(['-f', 'concat', '-safe', '0', '-i', listing, '-c', 'copy', joined])
+            runFfmpeg(['-i', joined, '-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse', '-r', str(fps), fileName])
+        else:
+            runFfmpeg(['-f', 'concat', '-safe', '0', '-i', listing, '-c', 'copy', fileName])
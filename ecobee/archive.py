@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reading of ecobee reports straight from compressed files, without extracting them to disk.
+
+A report path can be:
+    year/<device>.csv                     a plain csv file
+    year/<device>.csv.gz                  a gzip file
+    year/<device>.csv.zip                 a zip file with the report
+    container.zip/<member path>           a report inside a zip with many reports, like a whole year.
+                                          The member can also be given by its file name only.
+
+The zip files are kept open and their listings are cached, so reading many devices from the
+same container reads its central directory only once per process.
+"""
+
+import os
+import zipfile
+from collections import OrderedDict
+
+# open zip files by path: (pid, size, mtime, ZipFile, {file name: member name})
+openZips = OrderedDict()
+maxOpenZips = 16
+
+def splitPath(path):
+    '''
+    Description: It splits a report path into the file on disk and the member inside it.
+    Input:
+        path: A report path.
+    Output:
+        A tuple (file path, member name). The member name is None if the path isn't inside a zip container.
+    '''
+    if os.path.isfile(path):
+        return path, None
+    
+    # look for the deepest .zip file in the path
+    parts = path.replace('\\', '/').split('/')
+    for i in range(len(parts) - 1, 0, -1):
+        container = '/'.join(parts[:i])
+        if container.lower().endswith('.zip') and os.path.isfile(container):
+            return container, '/'.join(parts[i:])
+    return path, None
+
+def containerPath(path):
+    '''
+    Description: It returns the file on disk that holds a report.
+    '''
+    return splitPath(path)[0]
+
+def zipListing(container):
+    '''
+    Description:
+        It returns an open zip file and the map from the file names of its members to their full names.
+        Both are cached while the file doesn't change.
+    Input:
+        container: The zip file path.
+    Output:
+        A tuple (ZipFile, {file name: member name}).
+    '''
+    st = os.stat(container)
+    key = os.path.abspath(container)
+    
+    entry = openZips.get(key)
+    # a zip file opened before a fork can't be shared with the parent
+    if entry is not None and entry[:3] == (os.getpid(), st.st_size, st.st_mtime_ns):
+        openZips.move_to_end(key)
+        return entry[3], entry[4]
+    
+    if entry is not None:
+        entry[3].close()
+    archive = zipfile.ZipFile(container)
+    names = dict()
+    for name in archive.namelist():
+        names.setdefault(os.path.basename(name), name)
+    openZips[key] = (os.getpid(), st.st_size, st.st_mtime_ns, archive, names)
+    
+    while len(openZips) > maxOpenZips:
+        openZips.popitem(last=False)[1][3].close()
+    return archive, names
+
+def memberInfo(path):
+    '''
+    Description: It finds the zip member of a report path.
+    Input:
+        path: A report path.
+    Output:
+        A tuple (ZipFile, ZipInfo) or None if the report isn't in a zip file.
+    '''
+    container, member = splitPath(path)
+    if not container.lower().endswith('.zip'):
+        return None
+    
+    archive, names = zipListing(container)
+    if member is None:
+        # a zip file with a single report: <device>.csv.zip
+        member = os.path.basename(container)[:-4]
+        if member not in names:
+            csvs = [n for n in names if n.lower().endswith('.csv')]
+            if len(csvs) != 1:
+                raise FileNotFoundError('%s has %d csv files, choose one as %s/<member>' % (container, len(csvs), container))
+            member = csvs[0]
+    
+    name = member if member in archive.NameToInfo else names.get(os.path.basename(member))
+    if name is None:
+        raise FileNotFoundError('%s not found in %s' % (member, container))
+    return archive, archive.getinfo(name)
+
+def openReport(path):
+    '''
+    Description: It opens a report for reading, decompressing it on the fly if needed.
+    Input:
+        path: A report path (see the module description).
+    Output:
+        A binary file object.
+    '''
+    import gzip
+    
+    info = memberInfo(path)
+    if info is not None:
+        return info[0].open(info[1])
+    if path.lower().endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def contentHash(path):
+    '''
+    Description:
+        It returns a key for the content of a report: the hash of the file, or of the decompressed member
+        if the report is inside a zip container. The parse cache computes it only once for each version
+        of a file (see parseCache.contentKey).
+    Input:
+        path: A report path.
+    Output:
+        A string.
+    '''
+    import hashlib
+    from .cache import fileHash
+    
+    if memberInfo(path) is None:
+        return fileHash(path)
+    
+    digest = hashlib.blake2b(digest_size=20)
+    with openReport(path) as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binned statistics of a column against the bins of another one, like the mean time on of the
+device for each band of outdoor temperature. It is vectorized with numpy and can compute the
+bins of many devices at once.
+"""
+
+import numpy as np
+import pandas as pd
+
+def binEdges(values, width = 5):
+    '''
+    Description: It returns bin edges of a fixed width covering the values, starting at their minimum.
+    Input:
+        values: A numpy array.
+        width: The width of the bins.
+    Output:
+        A numpy array with the edges.
+    '''
+    low, high = np.nanmin(values), np.nanmax(values)
+    return low + width * np.arange(int(np.floor((high - low) / width)) + 2)
+
+def binnedStats(data, valueCol, binCol, edges = None, width = 5, closed = 'left', quantiles = (), by = None):
+    '''
+    Description:
+        It computes count, mean, standard deviation (ddof = 0) and quantiles of a column for each bin of 
+        another column, optionally for each group of rows (each device, for example). Rows with NaN in
+        any of the two columns or out of the edges are left out.
+    Input:
+        data: A pandas data frame.
+        valueCol: The name of the column to be summarized.
+        binCol: The name of the column to be binned.
+        edges: The bin edges, in increasing order. If None, bins of the given width are used.
+        width: The width of the bins when edges is None.
+        closed: 'left' for [low, high) bins, 'right' for (low, high] and 'neither' for (low, high).
+        quantiles: A list of quantiles to be computed, between 0 and 1.
+        by: The name of a column that groups the rows, or None.
+    Output:
+        A data frame with one row for each bin (of each group), with the columns: by (if passed),
+        'low', 'high', 'count', 'mean', 'std' and 'q<quantile>' for each quantile. Empty bins have NaN statistics.
+    '''
+    x = data[binCol].to_numpy(dtype=np.float64)
+    y = data[valueCol].to_numpy(dtype=np.float64)
+    if edges is None:
+        edges = binEdges(x, width)
+    edges = np.asarray(edges, dtype=np.float64)
+    nBins = len(edges) - 1
+    
+    if by is not None:
+        groupCodes, groups = pd.factorize(data[by], sort=True)
+    else:
+        groupCodes, groups = np.zeros(len(x), dtype=np.int64), [None]
+    
+    # bin of each row
+    if closed == 'right':
+        bins = np.searchsorted(edges, x, side='left') - 1
+    else:
+        bins = np.searchsorted(edges, x, side='right') - 1
+    valid = (bins >= 0) & (bins < nBins) & ~np.isnan(y) & ~np.isnan(x) & (groupCodes >= 0)
+    if closed == 'neither':
+        valid &= ~np.isin(x, edges)
+    
+    cells = (groupCodes * nBins + bins)[valid]
+    y = y[valid]
+    nCells = len(groups) * nBins
+    
+    count = np.bincount(cells, minlength=nCells)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(cells, weights=y, minlength=nCells) / count
+        std = np.sqrt(np.bincount(cells, weights=(y - mean[cells])**2, minlength=nCells) / count)
+    
+    stats = pd.DataFrame({'low': np.tile(edges[:-1], len(groups)),
+                          'high': np.tile(edges[1:], len(groups)),
+                          'count': count,
+                          'mean': mean,
+                          'std': std})
+    if by is not None:
+        stats.insert(0, by, np.repeat(np.asarray(groups), nBins))
+    
+    if len(quantiles):
+        # sort the values of each cell and interpolate like np.quantile (linear method)
+        order = np.lexsort((y, cells))
+        y = y[order]
+        starts = np.r_[0, np.cumsum(count)[:-1]]
+        filled = count > 0
+        for q in quantiles:
+            virtual = (count[filled] - 1) * q
+            previous = np.floor(virtual).astype(np.int64)
+            following = np.minimum(previous + 1, count[filled] - 1)
+            a = y[starts[filled] + previous]
+            b = y[starts[filled] + following]
+            t = virtual - previous
+            values = np.full(nCells, np.nan)
+            values[filled] = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+            stats['q%g' % q] = values
+    return stats
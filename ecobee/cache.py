@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of parsed ecobee reports.
+
+The data frames returned by ecobeeData.getDataFrame are stored in Feather (columnar) files, so a
+report is parsed only once. Entries are keyed by the source path, size, modification time and
+the hash of its content, and the least recently used ones are evicted when the cache grows
+beyond its size limit. It requires pyarrow; without it the cache is disabled and the reports
+are always parsed.
+"""
+
+import os
+
+# bump it whenever getDataFrame output changes, so old entries are not used anymore
+cacheVersion = 2
+
+defaultCacheDir = os.path.join(os.path.expanduser('~'), '.cache', 'ecobee')
+defaultMaxBytes = 2 * 1024**3
+
+# number of puts between full scans of the cache when it is below its size limit
+scanEvery = 200
+
+# fraction of maxBytes the cache is cut down to when it goes beyond it, so it isn't scanned again at every put
+lowWater = 0.9
+
+def fileHash(path, blockSize = 1 << 20):
+    '''
+    Description: It computes the hash of the content of a file.
+    Input:
+        path: The file path.
+        blockSize: Number of bytes read at a time.
+    Output:
+        A hexadecimal string.
+    '''
+    import hashlib
+    
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(blockSize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class parseCache:
+    
+    def __init__(self, directory = None, maxBytes = defaultMaxBytes):
+        '''
+        Description: Initialize the cache.
+        Input:
+            directory: Where the cache is kept. If None, it will be used $ECOBEE_CACHE_DIR or ~/.cache/ecobee.
+            maxBytes: Max size of the cached data. The least recently used entries are removed beyond it.
+        '''
+        if directory is None:
+            directory = os.environ.get('ECOBEE_CACHE_DIR', defaultCacheDir)
+        self.directory = directory
+        self.maxBytes = maxBytes
+        
+        # size of the cache at the last scan plus what this process stored since then
+        self.total = None
+        self.puts = 0
+        
+        try:
+            import pyarrow.feather
+            self.enabled = True
+        except ImportError:
+            self.enabled = False
+    
+    def load(self, path, parse):
+        '''
+        Description:
+            It returns the parsed data frame of a report from the cache. If it isn't cached yet,
+            the file is parsed and the result is stored.
+        Input:
+            path: The report file path.
+            parse: A function that receives the path and returns its data frame.
+        Output:
+            A pandas data frame.
+        '''
+        if not self.enabled:
+            return parse(path)
+        
+        key = self.contentKey(path)
+        data = self.get(key)
+        if data is None:
+            data = parse(path)
+            self.put(key, data)
+        return data
+    
+    def contentKey(self, path):
+        '''
+        Description:
+            It returns the key of the content of a file. The hash of the file is only computed when
+            its path, size or modification time aren't known yet.
+        Input:
+            path: The report path (see ecobee.archive).
+        Output:
+            A string.
+        '''
+        import hashlib
+        from . import archive
+        
+        st = os.stat(archive.containerPath(path))
+        signature = '%s|%d|%d' % (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        ref = os.path.join(self.directory, 'refs', hashlib.blake2b(signature.encode(), digest_size=16).hexdigest())
+        
+        try:
+            with open(ref, 'r') as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            pass
+        
+        key = archive.contentHash(path)
+        self.writeAtomic(ref, key.encode())
+        return key
+    
+    def objectPath(self, key):
+        '''
+        Description: It returns the path of the cached data frame of a key.
+        '''
+        return os.path.join(self.directory, 'objects', '%s-v%d.feather' % (key, cacheVersion))
+    
+    def get(self, key):
+        '''
+        Description: It reads a cached data frame and marks it as recently used.
+        Input:
+            key: The content key of the report.
+        Output:
+            A pandas data frame or None if it isn't cached.
+        '''
+        import pandas as pd
+        import numpy as np
+        
+        path = self.objectPath(key)
+        try:
+            data = pd.read_feather(path)
+            os.utime(path)
+        except (FileNotFoundError, OSError):
+            return None
+        
+        # missing strings come back as None
+        for column in data.columns[data.dtypes == object]:
+            data[column] = data[column].where(data[column].notna(), np.nan)
+        return data
+    
+    def put(self, key, data):
+        '''
+        Description: It stores a data frame and evicts the least recently used entries if needed.
+        Input:
+            key: The content key of the report.
+            data: The data frame.
+        '''
+        import io
+        
+        buffer = io.BytesIO()
+        data.reset_index(drop=True).to_feather(buffer)
+        self.writeAtomic(self.objectPath(key), buffer.getvalue())
+        
+        # the directory is only scanned when the running total goes beyond the limit, or now and then
+        # to see what other processes stored
+        self.puts += 1
+        if self.total is not None:
+            self.total += buffer.getbuffer().nbytes
+        if self.total is None or self.total > self.maxBytes or self.puts >= scanEvery:
+            self.evict()
+    
+    def evict(self):
+        '''
+        Description: 
+            If the cache is beyond maxBytes, it removes the least recently used entries until it fits in
+            lowWater * maxBytes. It also removes the references to entries that aren't in the cache anymore.
+            Temporary files being written are left alone.
+        '''
+        directory = os.path.join(self.directory, 'objects')
+        entries = list()
+        for name in os.listdir(directory):
+            if name.startswith('.tmp'):
+                continue
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        
+        total = sum(e[1] for e in entries)
+        entries.sort()
+        target = self.maxBytes * lowWater if total > self.maxBytes else self.maxBytes
+        while entries and total > target:
+            mtime, size, name = entries.pop(0)
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total = total
+        self.puts = 0
+        
+        kept = {name for mtime, size, name in entries}
+        refs = os.path.join(self.directory, 'refs')
+        for name in os.listdir(refs) if os.path.isdir(refs) else []:
+            if name.startswith('.tmp'):
+                continue
+            try:
+                with open(os.path.join(refs, name)) as file:
+                    key = file.read().strip()
+                if os.path.basename(self.objectPath(key)) not in kept:
+                    os.remove(os.path.join(refs, name))
+            except FileNotFoundError:
+                pass
+    
+    def clear(self):
+        '''
+        Description: It removes every entry of the cache.
+        '''
+        import shutil
+        
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def writeAtomic(self, path, content):
+        '''
+        Description: 
+            It writes a file through a temporary file and a rename, so other processes 
+            never read it half written.
+        Input:
+            path: The file path.
+            content: The bytes to be written.
+        '''
+        import tempfile
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp, path)
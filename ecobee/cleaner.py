@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming cleaner of malformed ecobee reports. It reads a report in blocks of bytes and, with
+array operations on each block, drops comment ('#') and blank lines and fixes the rows with a
+wrong number of fields: rows with missing fields are padded with empty ones, rows with extra
+fields (or every ragged row, if asked) are left out. The cleaned stream is read by the C parser
+of pandas, so a malformed report is parsed almost as fast as a clean one, in chunks if wanted.
+
+The ragged rows are written to a side file, <report>.bad, one per line as
+'<line number>\t<action>\t<row>'. The reports have no quoted fields, so the fields are counted
+by their commas.
+"""
+
+import io
+import os
+
+import numpy as np
+
+newlineByte, commaByte, hashByte = ord('\n'), ord(','), ord('#')
+
+class reportCleaner(io.RawIOBase):
+
+    def __init__(self, file, ragged = 'pad', badRows = None, blockSize = 1 << 22):
+        '''
+        Description: A binary file object that reads a report from file and returns it cleaned.
+        Input:
+            file: A binary file object with the report.
+            ragged: 'pad' to pad the rows with missing fields and leave out the ones with extra fields,
+                    or 'quarantine' to leave out every ragged row.
+            badRows: A text file object where the ragged rows are written, or None.
+            blockSize: Number of bytes read at a time.
+        '''
+        if ragged not in ('pad', 'quarantine'):
+            raise ValueError("ragged should be 'pad' or 'quarantine', not '%s'" % ragged)
+        self.file = file
+        self.ragged = ragged
+        self.badRows = badRows
+        self.blockSize = blockSize
+        
+        self.fields = None
+        self.lineNumber = 0
+        self.rest = b''
+        self.done = False
+        self.pending = memoryview(b'')
+        
+        # number of lines of each kind
+        self.counts = {'comment': 0, 'blank': 0, 'padded': 0, 'quarantined': 0}
+    
+    def readable(self):
+        return True
+    
+    def close(self):
+        '''
+        Description: It closes the report and the side file.
+        '''
+        if not self.closed:
+            self.file.close()
+            if self.badRows is not None:
+                self.badRows.close()
+        super().close()
+    
+    def readinto(self, buffer):
+        '''
+        Description: It fills buffer with the next bytes of the cleaned report.
+        Output:
+            The number of bytes written, 0 at the end of the report.
+        '''
+        while not self.pending and not self.done:
+            self.pending = memoryview(self.nextBlock())
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+    
+    def nextBlock(self):
+        '''
+        Description: It reads the next block of whole lines from the file and cleans it.
+        Output:
+            The cleaned bytes (maybe empty).
+        '''
+        block = self.file.read(self.blockSize)
+        if not block:
+            self.done = True
+            block, self.rest = self.rest, b''
+            if block and not block.endswith(b'\n'):
+                block += b'\n'
+        else:
+            block = self.rest + block
+            cut = block.rfind(b'\n') + 1
+            block, self.rest = block[:cut], block[cut:]
+        return self.clean(block) if block else b''
+    
+    def clean(self, block):
+        '''
+        Description: It cleans a block of whole lines.
+        Input:
+            block: Bytes ending with a new line.
+        Output:
+            The cleaned bytes.
+        '''
+        buf = np.frombuffer(block, dtype=np.uint8)
+        ends = np.flatnonzero(buf == newlineByte)
+        starts = np.r_[0, ends[:-1] + 1]
+        
+        # commas and hashes of each line
+        commas = np.searchsorted(np.flatnonzero(buf == commaByte), ends)
+        commas = np.diff(np.r_[0, commas])
+        hashes = np.diff(np.r_[0, np.searchsorted(np.flatnonzero(buf == hashByte), ends)])
+        length = ends - starts
+        blank = (length == 0) | ((length == 1) & (buf[starts] == ord('\r')))
+        comment = (hashes > 0) & ~blank
+        
+        first = self.lineNumber + 1
+        self.lineNumber += len(ends)
+        self.counts['blank'] += int(blank.sum())
+        self.counts['comment'] += int(comment.sum())
+        
+        if self.fields is None:
+            # the header is the first line with data, the lines before it are comments or blank
+            data = np.flatnonzero(~blank & ~comment)
+            if len(data) == 0:
+                return b''
+            self.fields = commas[data[0]] + 1
+        
+        bad = blank | comment | (commas != self.fields - 1)
+        if not bad.any():
+            return block
+        
+        # copy the good lines between the bad ones and fix or leave out the bad ones
+        pieces = list()
+        position = 0
+        for i in np.flatnonzero(bad):
+            pieces.append(block[position:starts[i]])
+            position = ends[i] + 1
+            if blank[i] or comment[i]:
+                continue
+            
+            line = block[starts[i]:ends[i]].rstrip(b'\r')
+            if commas[i] < self.fields - 1 and self.ragged == 'pad':
+                pieces.append(line + b',' * (self.fields - 1 - commas[i]) + b'\n')
+                action = 'padded'
+            else:
+                action = 'quarantined'
+            self.counts[action] += 1
+            if self.badRows is not None:
+                self.badRows.write('%d\t%s\t%s\n' % (first + i, action, line.decode(errors='replace')))
+        pieces.append(block[position:])
+        return b''.join(pieces)
+    
+    def report(self):
+        '''
+        Description: It returns a short text with the number of lines left out or fixed.
+        '''
+        return ', '.join('%d %s' % (n, kind) for kind, n in self.counts.items() if n)
+
+def badRowsPath(path):
+    '''
+    Description:
+        It returns the side file of the ragged rows of a report: <report>.bad next to the report, or
+        <container>.<member>.bad next to its zip container if the report is inside one (the container
+        without .zip and the member path with '_' for '/'), so members of different containers don't share it.
+    '''
+    from .archive import splitPath
+    
+    container, member = splitPath(path)
+    if member is None:
+        return container + '.bad'
+    stem = os.path.basename(container)
+    if stem.lower().endswith('.zip'):
+        stem = stem[:-4]
+    return os.path.join(os.path.dirname(container), '%s.%s.bad' % (stem, member.strip('/').replace('/', '_')))
+
+class sideFile:
+    
+    def __init__(self, path):
+        '''
+        Description: 
+            The side file of the ragged rows. It is created on the first row written, so clean reports
+            leave no side file, and the one of a previous parse is removed. If it can't be written, 
+            the rows are only counted.
+        '''
+        self.path = path
+        self.file = None
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def write(self, text):
+        if self.file is None:
+            try:
+                self.file = open(self.path, 'w')
+                self.file.write('line\taction\trow\n')
+            except OSError as e:
+                print('Could not write the ragged rows to %s: %s' % (self.path, e))
+                self.file = False
+        if self.file:
+            self.file.write(text)
+    
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def openCleanReport(path, ragged = 'pad', badRows = True):
+    '''
+    Description: It opens a report for reading through reportCleaner (see ecobee.archive.openReport for the paths).
+    Input:
+        path: The report file path.
+        ragged: See reportCleaner.
+        badRows: If True, the ragged rows are written to badRowsPath(path), if there is any. It can also
+                 be a path or None.
+    Output:
+        A buffered binary file object. Its cleaner attribute is the reportCleaner.
+    '''
+    from .archive import openReport
+    
+    if badRows is True:
+        badRows = badRowsPath(path)
+    side = sideFile(badRows) if badRows is not None else None
+    cleaner = reportCleaner(openReport(path), ragged, side)
+    reader = io.BufferedReader(cleaner, buffer_size = 1 << 20)
+    reader.cleaner = cleaner
+    return reader
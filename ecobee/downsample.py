@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Level of detail for line plots. A line with many more points than the pixels of its axes is
+reduced to the points that can be seen: the minimum and maximum of the points falling in each
+pixel column (minMaxIndices) or the points chosen by Largest-Triangle-Three-Buckets (lttbIndices).
+The functions return the indices of the kept points, so the same selection can be applied to
+other arrays of the plot.
+"""
+
+import numpy as np
+
+def segmentFirst(mask, segment):
+    '''
+    Description: It returns the index of the first True of mask in each segment.
+    Input:
+        mask: A boolean numpy array.
+        segment: The segment number of each position, in non-decreasing order.
+    Output:
+        A numpy array with the indices.
+    '''
+    idx = np.flatnonzero(mask)
+    seg = segment[idx]
+    return idx[np.r_[True, seg[1:] != seg[:-1]]] if len(idx) else idx
+
+def minMaxIndices(x, y, nBuckets):
+    '''
+    Description:
+        It splits the range of x in nBuckets buckets of the same width (one for each pixel column) and
+        keeps the minimum and the maximum of y for each run of consecutive points in the same bucket,
+        besides the first and the last points. The drawn line keeps all of its visible extremes.
+    Input:
+        x, y: numpy arrays without NaN.
+        nBuckets: Number of buckets, usually the width of the axes in pixels.
+    Output:
+        A sorted numpy array with the indices of the kept points.
+    '''
+    n = len(y)
+    if n <= 2*nBuckets + 2:
+        return np.arange(n)
+    
+    low, high = x.min(), x.max()
+    scale = nBuckets / (high - low) if high > low else 0
+    bucket = np.minimum(((x - low) * scale).astype(np.int64), nBuckets - 1)
+    
+    # runs of consecutive points in the same bucket
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    
+    lo = np.minimum.reduceat(y, starts)
+    hi = np.maximum.reduceat(y, starts)
+    keep = np.r_[0, n - 1, segmentFirst(y == lo[segment], segment), segmentFirst(y == hi[segment], segment)]
+    return np.unique(keep)
+
+def lttbIndices(x, y, nOut):
+    '''
+    Description:
+        Largest-Triangle-Three-Buckets downsampling. The points between the first and the last ones are
+        split in nOut - 2 buckets with the same number of points, and from each bucket it keeps the point
+        that forms the largest triangle with the point kept from the previous bucket and the mean of
+        the next bucket.
+    Input:
+        x, y: numpy arrays without NaN.
+        nOut: Number of points to be kept.
+    Output:
+        A sorted numpy array with the indices of the kept points.
+    '''
+    n = len(y)
+    if nOut >= n or nOut < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # bucket bounds of the inner points and the mean point of each bucket
+    bounds = 1 + ((n - 2) * np.arange(nOut - 1)) // (nOut - 2)
+    counts = np.diff(bounds)
+    meanX = np.r_[np.add.reduceat(x[1:n-1], bounds[:-1] - 1) / counts, x[-1]]
+    meanY = np.r_[np.add.reduceat(y[1:n-1], bounds[:-1] - 1) / counts, y[-1]]
+    
+    keep = np.empty(nOut, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for k in range(nOut - 2):
+        first, last = bounds[k], bounds[k+1]
+        ax, ay = x[a], y[a]
+        cx, cy = meanX[k+1], meanY[k+1]
+        area = np.abs((ax - cx) * (y[first:last] - ay) - (ax - x[first:last]) * (cy - ay))
+        a = first + int(np.argmax(area))
+        keep[k+1] = a
+    return keep
+
+def lodIndices(x, ys, width, method = 'minmax'):
+    '''
+    Description:
+        It returns the indices of the points of the lines (x, y) for y in ys to be drawn in axes with
+        the given width. The points kept for each line are joined, so the lines share their x values.
+    Input:
+        x: A numpy array with the x values.
+        ys: A list of numpy arrays with the y values, without NaN.
+        width: The width of the axes in pixels.
+        method: 'minmax', 'lttb' or None (keep all the points).
+    Output:
+        A sorted numpy array with the indices of the kept points.
+    '''
+    width = max(int(width), 1)
+    if method is None or len(x) <= 2*width + 2:
+        return np.arange(len(x))
+    
+    if method == 'minmax':
+        keep = [minMaxIndices(x, y, width) for y in ys]
+    elif method == 'lttb':
+        keep = [lttbIndices(x, y, 2*width) for y in ys]
+    else:
+        raise ValueError("Unknown level of detail method '%s'" % method)
+    return np.unique(np.concatenate(keep))
+
+def axesWidth(ax):
+    '''
+    Description: It returns the width of matplotlib axes in pixels when the figure is saved or shown.
+    '''
+    import matplotlib
+    
+    dpi = matplotlib.rcParams['savefig.dpi']
+    scale = 1 if dpi == 'figure' else max(dpi / ax.figure.dpi, 1)
+    return int(ax.get_window_extent().width * scale)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent, cached download of the Ecobee Donate Your Data 2019 files.
+
+The files are downloaded through a storage backend (the Google Cloud bucket through gsutil, or a
+local directory that can stand in for it) by a pool of threads, checked against the size and md5
+reported by the backend, and kept in a local content-addressed cache. Files already in the cache
+are never transferred again.
+
+Example:
+    fetcher = datasetFetcher(backendFor('gs://donate_your_data_2019/files'))
+    ecobee = ecobeeData()
+    ecobee.extend(fetcher.fetchDevice(device))
+"""
+
+import os
+
+from .cache import defaultCacheDir
+
+defaultBucket = 'gs://donate_your_data_2019/files'
+defaultKey = '{year}/{device}.csv.zip'
+
+class localBackend:
+    
+    def __init__(self, root):
+        '''
+        Description: A backend that reads the files from a local directory (or a file:// uri).
+        Input:
+            root: The directory with the same layout as the bucket.
+        '''
+        if root.startswith('file://'):
+            root = root[len('file://'):]
+        self.root = root
+        self.name = 'file://' + os.path.abspath(root)
+    
+    def stat(self, key):
+        '''
+        Description: It returns the size and the md5 (or None if unknown) of a file.
+        '''
+        return os.stat(os.path.join(self.root, key)).st_size, None
+    
+    def download(self, key, dest):
+        '''
+        Description: It copies a file to dest.
+        '''
+        import shutil
+        
+        shutil.copyfile(os.path.join(self.root, key), dest)
+
+class gcsBackend:
+    
+    def __init__(self, bucket = defaultBucket, gsutil = 'gsutil'):
+        '''
+        Description: A backend that downloads the files from Google Cloud Storage with gsutil.
+        Input:
+            bucket: The gs:// uri of the directory with the files.
+            gsutil: The gsutil command.
+        '''
+        self.bucket = bucket.rstrip('/')
+        self.gsutil = gsutil
+        self.name = self.bucket
+    
+    def stat(self, key):
+        '''
+        Description: It returns the size and the md5 of a file, as reported by the bucket.
+        '''
+        import base64
+        import subprocess
+        
+        uri = self.bucket + '/' + key
+        result = subprocess.run([self.gsutil, 'ls', '-L', uri], capture_output=True, text=True)
+        if result.returncode != 0:
+            if 'No URLs matched' in result.stderr:
+                raise FileNotFoundError(uri)
+            raise IOError(result.stderr.strip())
+        
+        size, md5 = None, None
+        for line in result.stdout.splitlines():
+            name, _, value = line.strip().partition(':')
+            if name == 'Content-Length':
+                size = int(value)
+            elif name == 'Hash (md5)':
+                md5 = base64.b64decode(value.strip()).hex()
+        return size, md5
+    
+    def download(self, key, dest):
+        '''
+        Description: It downloads a file to dest.
+        '''
+        import subprocess
+        
+        result = subprocess.run([self.gsutil, '-q', 'cp', self.bucket + '/' + key, dest], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise IOError(result.stderr.strip() or 'gsutil cp exited with code %d' % result.returncode)
+
+def backendFor(uri):
+    '''
+    Description: It returns the backend of a gs://, file:// or local directory uri.
+    '''
+    if uri.startswith('gs://'):
+        return gcsBackend(uri)
+    return localBackend(uri)
+
+class datasetFetcher:
+    
+    def __init__(self, backend, cacheDir = None, workers = 8, retries = 3):
+        '''
+        Description: Initialize the fetcher.
+        Input:
+            backend: A storage backend (localBackend, gcsBackend or any object with stat, download and name).
+            cacheDir: Where the downloaded files are kept. If None, it will be used <cache dir>/files
+                      in $ECOBEE_CACHE_DIR or ~/.cache/ecobee.
+            workers: Number of concurrent downloads.
+            retries: How many times a failed download is tried again.
+        '''
+        if cacheDir is None:
+            cacheDir = os.path.join(os.environ.get('ECOBEE_CACHE_DIR', defaultCacheDir), 'files')
+        self.backend = backend
+        self.cacheDir = cacheDir
+        self.workers = workers
+        self.retries = retries
+    
+    def refPath(self, key):
+        '''
+        Description: It returns the path of the file that points a remote key to its cached content.
+        '''
+        import hashlib
+        
+        name = hashlib.sha1((self.backend.name + '/' + key).encode()).hexdigest()
+        return os.path.join(self.cacheDir, 'refs', name + '.json')
+    
+    def fetchOne(self, key):
+        '''
+        Description:
+            It returns the local path of a remote file, downloading it only if it isn't in the cache.
+            The download is checked against the size and md5 reported by the backend, and tried again
+            on failure.
+        Input:
+            key: The file key in the backend, like '2017/<device>.csv.zip'.
+        Output:
+            The path of the cached file. It keeps the suffix of the key (.csv.zip, ...).
+        '''
+        import json
+        import time
+        import hashlib
+        import tempfile
+        
+        ref = self.refPath(key)
+        try:
+            with open(ref) as file:
+                path = os.path.join(self.cacheDir, json.load(file)['object'])
+            if os.path.exists(path):
+                return path
+        except FileNotFoundError:
+            pass
+        
+        size, md5 = self.backend.stat(key)
+        base = os.path.basename(key)
+        suffix = base[base.index('.'):] if '.' in base else ''
+        os.makedirs(os.path.join(self.cacheDir, 'objects'), exist_ok=True)
+        
+        for attempt in range(self.retries + 1):
+            fd, tmp = tempfile.mkstemp(dir=os.path.join(self.cacheDir, 'objects'), prefix='.tmp')
+            os.close(fd)
+            try:
+                self.backend.download(key, tmp)
+                
+                sha, check = hashlib.sha256(), hashlib.md5()
+                with open(tmp, 'rb') as file:
+                    for block in iter(lambda: file.read(1 << 20), b''):
+                        sha.update(block)
+                        check.update(block)
+                if size is not None and os.path.getsize(tmp) != size:
+                    raise IOError('%s: expected %d bytes, got %d' % (key, size, os.path.getsize(tmp)))
+                if md5 is not None and check.hexdigest() != md5:
+                    raise IOError('%s: md5 mismatch' % key)
+                
+                name = os.path.join('objects', sha.hexdigest() + suffix)
+                os.replace(tmp, os.path.join(self.cacheDir, name))
+                break
+            except (IOError, OSError) as e:
+                if attempt == self.retries:
+                    raise
+                print('Download of %s failed (%s), trying again...' % (key, e))
+                time.sleep(2 ** attempt)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        with open(ref + '.tmp', 'w') as file:
+            json.dump({'key': key, 'size': size, 'md5': md5, 'object': name}, file)
+        os.replace(ref + '.tmp', ref)
+        return os.path.join(self.cacheDir, name)
+    
+    def fetch(self, keys):
+        '''
+        Description: It fetches many files concurrently. See fetchOne.
+        Input:
+            keys: A list of file keys.
+        Output:
+            A dictionary mapping each key to its local path, or to the exception raised if it 
+            couldn't be fetched (FileNotFoundError if it doesn't exist in the backend).
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+        
+        def run(key):
+            try:
+                return self.fetchOne(key)
+            except Exception as e:
+                return e
+        
+        keys = list(keys)
+        with ThreadPoolExecutor(self.workers) as pool:
+            return dict(zip(keys, pool.map(run, keys)))
+    
+    def fetchDevices(self, devices, years = range(2015, 2020), template = defaultKey):
+        '''
+        Description: It fetches the yearly files of many devices concurrently.
+        Input:
+            devices: A list of device identifiers.
+            years: The years to fetch.
+            template: The key of the file of a device in a year.
+        Output:
+            A dictionary mapping each device to the list of local paths of its files, in the order
+            of the years. The years without a file for the device are left out; other failures are printed.
+        '''
+        keys = [(device, template.format(year=year, device=device)) for device in devices for year in years]
+        results = self.fetch([key for device, key in keys])
+        
+        paths = {device: [] for device in devices}
+        for device, key in keys:
+            result = results[key]
+            if isinstance(result, Exception):
+                if not isinstance(result, FileNotFoundError):
+                    print('Could not fetch %s: %s' % (key, repr(result)))
+                continue
+            paths[device].append(result)
+        return paths
+    
+    def fetchDevice(self, device, years = range(2015, 2020), template = defaultKey):
+        '''
+        Description: It fetches the yearly files of one device. See fetchDevices.
+        Output:
+            A list of local paths, ready for ecobeeData.extend.
+        '''
+        return self.fetchDevices([device], years, template)[device]
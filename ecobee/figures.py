@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch rendering of the plots of ecobeeData for many devices, without a display.
+
+Each worker process keeps one figure on the Agg backend for each plot and reuses its axes for
+every device, so the figures are created only once in each process. The files are written as
+<output directory>/<device>_<plot>.<format> (png, svg, pdf, ...). The daily summaries can be
+computed from the report files or taken from the table written by ecobee.fleet.
+
+Usage from the command line:
+    python -m ecobee.figures --metadata meta_data.csv --root ../data_set/ecobee --select ProvinceState ON --output figures
+"""
+
+import os
+
+from . import metadata as md
+from . import preprocessing as pp
+from .fleet import defaultYears, deviceFiles, summarizeDevice, printProgress, writeAtomic, addSelectionArguments, selectDevices
+
+# plot name -> (ecobeeData method, its arguments)
+plotKinds = {'comparison': ('plotComparison', {'summ': True}),
+             'txd':        ('plotTxD', {})}
+
+class figureRenderer:
+
+    def __init__(self, figsize = (16,12), dpi = 100):
+        '''
+        Description: 
+            It keeps one figure on the Agg backend for each kind of plot, created on its first use.
+            The axes of a plot are only drawn by the same plot, so clearing them is enough to reuse them
+            (settings like the grid alpha are not reset by clearing).
+        Input:
+            figsize: Figure size in inches.
+            dpi: Resolution of the raster formats.
+        '''
+        self.figsize = figsize
+        self.dpi = dpi
+        self.figures = dict()
+    
+    def axes(self, kind):
+        '''
+        Description: It returns the figure and the cleared axes of a kind of plot.
+        '''
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        
+        if kind not in self.figures:
+            figure = Figure(figsize = self.figsize, dpi = self.dpi)
+            FigureCanvasAgg(figure)
+            self.figures[kind] = (figure, figure.add_subplot(1, 1, 1))
+        figure, ax = self.figures[kind]
+        ax.cla()
+        return figure, ax
+    
+    def render(self, ecobee, kind, paths):
+        '''
+        Description: It draws a plot of an ecobeeData object and saves it.
+        Input:
+            ecobee: An ecobeeData object with its summary.
+            kind: A key of plotKinds.
+            paths: A list of file paths. The format of each one is taken from its extension.
+        '''
+        method, kwargs = plotKinds[kind]
+        figure, ax = self.axes(kind)
+        getattr(ecobee, method)(ax = ax, **kwargs)
+        for path in paths:
+            figure.savefig(path, dpi = self.dpi)
+
+# the renderer of this process
+renderer = None
+
+def renderDevice(device, paths, output, kinds = tuple(plotKinds), formats = ('png',), cache = True, summ = None,
+                 fetcher = None, years = defaultYears):
+    '''
+    Description: It renders the plots of a device. It runs in the worker processes.
+    Input:
+        device: The device identifier.
+        paths: The report files of the device, or None to get them from fetcher. They are not used if summ is passed.
+        output: The directory of the figures.
+        kinds: The names of the plots (keys of plotKinds).
+        formats: The file formats.
+        cache: See ecobeeData.
+        summ: The daily summary of the device, or None to compute it from paths.
+        fetcher, years: See ecobee.fleet.summarizeDevice.
+    Output:
+        A tuple (device, list of files, None) or (device, None, error message) if it failed.
+    '''
+    global renderer
+    
+    try:
+        if summ is None:
+            device, summ, error, records = summarizeDevice(device, paths, cache, fetcher = fetcher, years = years)
+            if error is not None:
+                return device, None, error
+        
+        ecobee = pp.ecobeeData(cache = False)
+        ecobee.summ = summ
+        
+        if renderer is None:
+            renderer = figureRenderer()
+        files = list()
+        for kind in kinds:
+            kindFiles = [os.path.join(output, '%s_%s.%s' % (device, kind, ext)) for ext in formats]
+            renderer.render(ecobee, kind, kindFiles)
+            files += kindFiles
+        return device, files, None
+    except Exception as e:
+        return device, None, '%s: %s' % (type(e).__name__, e)
+
+def renderFleet(devices,
+                root,
+                output,
+                kinds = tuple(plotKinds),
+                formats = ('png',),
+                years = defaultYears,
+                workers = None,
+                summary = None,
+                retryFailed = False,
+                cache = True,
+                fetcher = None,
+                progress = printProgress):
+    '''
+    Description:
+        It renders the plots of every device in parallel worker processes. The devices whose
+        files already exist (or that failed before, unless retryFailed) are skipped, so a run
+        can be resumed.
+    Input:
+        devices: A list of device identifiers or a data frame selected from metaData.
+        root: The dataset directory, with one directory for each year.
+        output: The directory of the figures.
+        kinds: The names of the plots (keys of plotKinds).
+        formats: The file formats, like 'png', 'svg' or 'pdf'.
+        years: The years to look for.
+        workers: Number of worker processes. If None, it uses one per CPU.
+        summary: The table written by processFleet (path or data frame). If passed, the plots are
+                 made from it instead of the report files.
+        retryFailed: If True, the devices that failed before are processed again.
+        cache: See ecobeeData.
+        fetcher: A datasetFetcher to get the report files (in the worker processes) instead of reading them from root.
+        progress: A function called as progress(done, total, device, error, elapsed) for each
+                  device, or None.
+    Output:
+        A dictionary mapping each device that failed to its error message.
+    '''
+    import time
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    if isinstance(devices, pd.DataFrame):
+        devices = devices[md.dataIdCol].values
+    devices = list(dict.fromkeys(devices))
+    os.makedirs(output, exist_ok=True)
+    
+    def errorPath(device):
+        return os.path.join(output, device + '.error')
+    
+    # skip the devices of a previous run
+    todo = list()
+    for device in devices:
+        if all(os.path.exists(os.path.join(output, '%s_%s.%s' % (device, kind, ext))) for kind in kinds for ext in formats):
+            continue
+        if os.path.exists(errorPath(device)) and not retryFailed:
+            continue
+        todo.append(device)
+    
+    summaries = dict()
+    paths = dict.fromkeys(todo, [])
+    if summary is not None:
+        if not isinstance(summary, pd.DataFrame):
+            summary = pd.read_csv(summary)
+        summary = summary[summary[md.dataIdCol].isin(todo)]
+        summaries = {device: summ.drop(columns=md.dataIdCol) for device, summ in summary.groupby(md.dataIdCol, sort=False)}
+        missing = [device for device in todo if device not in summaries]
+    else:
+        missing = todo
+    
+    # with a fetcher, each worker downloads the files of its device
+    if fetcher is not None:
+        paths.update(dict.fromkeys(missing))
+    else:
+        paths.update({device: deviceFiles(root, device, years) for device in missing})
+    
+    failures = dict()
+    start = time.time()
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(renderDevice, device, paths[device], output, kinds, formats, cache, summaries.get(device),
+                               fetcher, years)
+                   for device in todo]
+        for done, future in enumerate(as_completed(futures), 1):
+            device, files, error = future.result()
+            if error is None:
+                if os.path.exists(errorPath(device)):
+                    os.remove(errorPath(device))
+            else:
+                writeAtomic(errorPath(device), error)
+                failures[device] = error
+            if progress is not None:
+                progress(done, len(todo), device, error, time.time() - start)
+    
+    # failures of the devices skipped
+    for device in devices:
+        if device not in failures and os.path.exists(errorPath(device)):
+            with open(errorPath(device)) as error:
+                failures[device] = error.read()
+    return failures
+
+def main(argv = None):
+    '''
+    Description: Command line entry point. Run with --help for the options.
+    '''
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Render the plots of many ecobee devices to files.')
+    addSelectionArguments(parser)
+    parser.add_argument('--output', default='figures', help='directory of the figures')
+    parser.add_argument('--plots', nargs='+', default=list(plotKinds), choices=list(plotKinds))
+    parser.add_argument('--formats', nargs='+', default=['png'])
+    parser.add_argument('--summary', default=None, help='table written by ecobee.fleet, used instead of the report files')
+    parser.add_argument('--retry-failed', action='store_true')
+    args = parser.parse_args(argv)
+    
+    selection, fetcher = selectDevices(parser, args)
+    
+    print('Rendering %d devices...' % selection.shape[0])
+    failures = renderFleet(selection, args.root, args.output,
+                           kinds = args.plots,
+                           formats = args.formats,
+                           years = args.years,
+                           workers = args.workers,
+                           summary = args.summary,
+                           retryFailed = args.retry_failed,
+                           cache = not args.no_cache,
+                           fetcher = fetcher)
+    print('Done! %d devices failed.' % len(failures))
+
+if __name__ == '__main__':
+    main()
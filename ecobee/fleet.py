@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fleet processing of the Ecobee Donate Your Data 2019 dataset.
+
+It summarizes many devices in parallel worker processes (load -> summarizeData for each device)
+and writes one table with the daily summary of every device. Each device is written to its own
+part file as soon as it is done, so a run that crashed can be resumed, and a device that fails
+doesn't stop the others.
+
+Usage from the command line:
+    python -m ecobee.fleet --metadata meta_data.csv --root ../data_set/ecobee --select ProvinceState ON --output summary.csv
+"""
+
+import os
+
+from . import metadata as md
+from . import preprocessing as pp
+
+defaultYears = [str(year) for year in range(2015, 2020)]
+
+def deviceFiles(root, device, years = defaultYears):
+    '''
+    Description: 
+        It lists the report files of a device that exist in the dataset. For each year it looks for 
+        <device>.csv, <device>.csv.zip and <device>.csv.gz in that order.
+    Input:
+        root: The dataset directory, with one directory for each year.
+        device: The device identifier.
+        years: The years to look for.
+    Output:
+        A list of file paths in chronological order.
+    '''
+    paths = list()
+    for year in years:
+        for ext in ['.csv', '.csv.zip', '.csv.gz']:
+            path = os.path.join(root, year, device + ext)
+            if os.path.exists(path):
+                paths.append(path)
+                break
+    return paths
+
+def summarizeDevice(device, paths, cache = True, metrics = None, fetcher = None, years = defaultYears):
+    '''
+    Description: It loads the report files of a device and computes its daily summary.
+    Input:
+        device: The device identifier.
+        paths: The report files of the device, or None to get them from fetcher.
+        cache: See ecobeeData.
+        metrics: An empty stageMetrics object to record the stages, or None.
+        fetcher: A datasetFetcher that downloads the files of the device (in the worker process), or None.
+        years: The years fetched.
+    Output:
+        A tuple (device, summary data frame, None, records) or (device, None, error message, records) 
+        if it failed. records is the list of stage records (empty if metrics is None).
+    '''
+    records = metrics.records if metrics is not None else []
+    try:
+        if paths is None:
+            paths = fetcher.fetchDevice(device, years)
+        if not paths:
+            raise FileNotFoundError('no report files for device %s' % device)
+        
+        ecobee = pp.ecobeeData(cache, metrics = metrics)
+        failures = ecobee.extend(paths, workers = 1)
+        if ecobee.size == 0:
+            raise ValueError('no report could be loaded: %s' % failures)
+        ecobee.summarizeData()
+        
+        summ = ecobee.summ
+        summ.insert(0, md.dataIdCol, device)
+        return device, summ, None, records
+    except Exception as e:
+        return device, None, '%s: %s' % (type(e).__name__, e), records
+
+def printProgress(done, total, device, error, elapsed):
+    '''
+    Description: Default progress report of processFleet.
+    '''
+    eta = elapsed / done * (total - done)
+    status = 'FAILED ' + error if error else 'ok'
+    print('[%d/%d] %s %s (elapsed %.0fs, eta %.0fs)' % (done, total, device, status, elapsed, eta), flush=True)
+
+def processFleet(devices, 
+                 root, 
+                 output, 
+                 years = defaultYears, 
+                 workers = None, 
+                 workDir = None, 
+                 retryFailed = False, 
+                 cache = True,
+                 fetcher = None,
+                 progress = printProgress,
+                 metrics = None):
+    '''
+    Description:
+        It summarizes every device in parallel worker processes and writes one table with the
+        daily summary of all devices, with the device identifier in the first column.
+        Each device is kept in workDir as soon as it is done (or failed), and those devices are
+        skipped when the run is started again.
+    Input:
+        devices: A list of device identifiers or a data frame selected from metaData.
+        root: The dataset directory, with one directory for each year.
+        output: The path of the consolidated csv table.
+        years: The years to look for.
+        workers: Number of worker processes. If None, it uses one per CPU.
+        workDir: Where the part files are kept. If None, it will be used output + '.parts'.
+        retryFailed: If True, the devices that failed before are processed again.
+        cache: See ecobeeData.
+        fetcher: A datasetFetcher. If passed, the files of the devices are downloaded (or taken from 
+                 its cache) by the worker processes, one device at a time, instead of read from root.
+        progress: A function called as progress(done, total, device, error, elapsed) for each
+                  device, or None.
+        metrics: A stageMetrics object that receives the stages of every worker, or None.
+    Output:
+        A dictionary mapping each device that failed to its error message.
+    '''
+    import time
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    if isinstance(devices, pd.DataFrame):
+        devices = devices[md.dataIdCol].values
+    devices = list(dict.fromkeys(devices))
+    
+    if workDir is None:
+        workDir = output + '.parts'
+    os.makedirs(workDir, exist_ok=True)
+    
+    def partPath(device, ext):
+        return os.path.join(workDir, device + ext)
+    
+    # skip the devices of a previous run
+    todo = list()
+    for device in devices:
+        if os.path.exists(partPath(device, '.csv')):
+            continue
+        if os.path.exists(partPath(device, '.error')) and not retryFailed:
+            continue
+        todo.append(device)
+    
+    # with a fetcher, each worker downloads the files of its device, so summarizing starts at once
+    if fetcher is not None:
+        paths = dict.fromkeys(todo)
+    else:
+        paths = {device: deviceFiles(root, device, years) for device in todo}
+    
+    start = time.time()
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(summarizeDevice, device, paths[device], cache, metrics.child() if metrics is not None else None,
+                               fetcher, years)
+                   for device in todo]
+        for done, future in enumerate(as_completed(futures), 1):
+            device, summ, error, records = future.result()
+            if metrics is not None:
+                metrics.merge(records)
+            if error is None:
+                writeAtomic(partPath(device, '.csv'), summ.to_csv(index=False))
+                if os.path.exists(partPath(device, '.error')):
+                    os.remove(partPath(device, '.error'))
+            else:
+                writeAtomic(partPath(device, '.error'), error)
+            if progress is not None:
+                progress(done, len(todo), device, error, time.time() - start)
+    
+    # consolidate the parts in the order of the devices
+    failures = dict()
+    header = True
+    with open(output + '.tmp', 'w') as file:
+        for device in devices:
+            if os.path.exists(partPath(device, '.csv')):
+                pd.read_csv(partPath(device, '.csv')).to_csv(file, index=False, header=header)
+                header = False
+            elif os.path.exists(partPath(device, '.error')):
+                with open(partPath(device, '.error')) as error:
+                    failures[device] = error.read()
+    os.replace(output + '.tmp', output)
+    return failures
+
+def writeAtomic(path, text):
+    '''
+    Description: It writes a text file through a temporary file, so a crash never leaves it half written.
+    '''
+    with open(path + '.tmp', 'w') as file:
+        file.write(text)
+    os.replace(path + '.tmp', path)
+
+def addSelectionArguments(parser):
+    '''
+    Description: It adds the options that select devices from the metadata to an argparse parser.
+    '''
+    parser.add_argument('--metadata', required=True, help='path of meta_data.csv')
+    parser.add_argument('--root', default='.', help='dataset directory with one directory for each year')
+    parser.add_argument('--bucket', default=None, 
+                        help='download the files from this gs:// or file:// uri instead of reading them from --root')
+    parser.add_argument('--select', nargs=2, action='append', default=[], metavar=('COLUMN', 'VALUE'),
+                        help='keep the devices whose COLUMN equals VALUE (repeat it for more values or columns)')
+    parser.add_argument('--range', nargs=3, action='append', default=[], metavar=('COLUMN', 'LOW', 'HIGH'),
+                        help='keep the devices whose numeric COLUMN is from LOW to HIGH')
+    parser.add_argument('--years', nargs='+', default=defaultYears)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true')
+
+def selectDevices(parser, args):
+    '''
+    Description: It applies the options of addSelectionArguments.
+    Output:
+        A tuple (data frame with the metadata of the selected devices, datasetFetcher or None).
+    '''
+    metadata = md.metaData(args.metadata)
+    criteria = dict()
+    for column, value in args.select:
+        if column not in metadata.data.columns:
+            parser.error('unknown metadata column: %s' % column)
+        if metadata.data[column].dtype.kind in 'iuf':
+            value = float(value)
+        criteria.setdefault(column, []).append(value)
+    for column, low, high in args.range:
+        if column not in metadata.data.columns:
+            parser.error('unknown metadata column: %s' % column)
+        criteria[column] = (float(low), float(high))
+    selection = metadata.query(criteria)
+    
+    fetcher = None
+    if args.bucket is not None:
+        from .fetcher import datasetFetcher, backendFor
+        fetcher = datasetFetcher(backendFor(args.bucket))
+    return selection, fetcher
+
+def main(argv = None):
+    '''
+    Description: Command line entry point. Run with --help for the options.
+    '''
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Summarize many ecobee devices in parallel.')
+    addSelectionArguments(parser)
+    parser.add_argument('--output', default='fleet_summary.csv')
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--retry-failed', action='store_true')
+    parser.add_argument('--metrics', default=None, help='write the time, rows and peak memory of each stage to this JSON file')
+    args = parser.parse_args(argv)
+    
+    selection, fetcher = selectDevices(parser, args)
+    
+    metrics = None
+    if args.metrics is not None:
+        from .metrics import stageMetrics
+        metrics = stageMetrics()
+    
+    print('Processing %d devices...' % selection.shape[0])
+    failures = processFleet(selection, args.root, args.output, 
+                            years = args.years, 
+                            workers = args.workers, 
+                            workDir = args.work_dir, 
+                            retryFailed = args.retry_failed,
+                            cache = not args.no_cache,
+                            fetcher = fetcher,
+                            metrics = metrics)
+    print('Done! %d devices failed.' % len(failures))
+    
+    if metrics is not None:
+        metrics.dump(args.metrics)
+        print(metrics.summary().to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -29,13 +29,127 @@ remSenNumCol = 'Number of Remote Sensors'
 plsEnrCol    = 'eco+ enrolled'
 plsEnrLvlCol = 'eco+ slider level'
 
+# columns loaded as categorical and as numeric
+categoricalCols = [countryCol, frstCnctCol, plcStyleCol, provStateCol, cityCol, modelCol, 
+                   compAuxCol, ElectricCol, heatPumpCol, heatTypeCol, plsEnrCol]
+numericCols     = [areaCol, plcAgeCol, occpNumCol, coolStageCol, heatStageCol, remSenNumCol, plsEnrLvlCol]
+
+import numpy as np
 import pandas as pd
 
 class metaData:
   
-    def __init__(self, path):
+    def __init__(self, path, typed = True):
+        '''
+        Description: It loads the metadata table.
+        Input:
+            path: The meta_data.csv file path.
+            typed: If True, the text columns in categoricalCols are loaded as categorical 
+                   and the columns in numericCols as numeric.
+        '''
         self.data = pd.read_csv(path)
+        if typed:
+            for column in categoricalCols:
+                if column in self.data.columns:
+                    self.data[column] = self.data[column].astype('category')
+            for column in numericCols:
+                if column in self.data.columns:
+                    self.data[column] = pd.to_numeric(self.data[column], errors='coerce')
+        self.indexes = dict()
         
     def select(self, column, target):
+        '''
+        Description: It selects the rows whose column is equal to target.
+        Input:
+            column: The name of the column.
+            target: The value of interest.
+        Output:
+            A data frame with the rows selected, in their original order, or None if the column doesn't exist.
+        '''
         if column in self.data.columns:
-            return self.data[self.data[column] == target]
\ No newline at end of file
+            return self.data.iloc[self.positions(column, target)]
+    
+    def query(self, criteria):
+        '''
+        Description:
+            It selects the rows that satisfy all the criteria. For example, the houses of Ontario
+            with floor area from 1000 to 2000 ft2:
+                metadata.query({provStateCol: 'ON', areaCol: (1000, 2000)})
+        Input:
+            criteria: A dictionary mapping column names to:
+                a value: the rows equal to it;
+                a list or set: the rows equal to any of its values;
+                a tuple (low, high): the rows from low to high, both inclusive. Use None for an open side.
+        Output:
+            A data frame with the rows selected, in their original order.
+        '''
+        for column in criteria:
+            if column not in self.data.columns:
+                raise KeyError(column)
+        
+        # start from the criterion with fewer matches
+        matches = sorted((self.positions(c, t) for c, t in criteria.items()), key=len)
+        positions = matches[0] if matches else np.arange(self.data.shape[0])
+        for other in matches[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return self.data.iloc[positions]
+    
+    def positions(self, column, target):
+        '''
+        Description: It finds the rows that match a criterion of query using the index of the column.
+        Input:
+            column: The name of the column.
+            target: A value, a list or set of values, or a tuple (low, high).
+        Output:
+            A sorted numpy array with the positions of the rows.
+        '''
+        kind, index = self.index(column)
+        
+        if isinstance(target, (list, set)):
+            found = [self.positions(column, t) for t in target]
+            return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+        
+        if kind == 'sorted':
+            order, values = index
+            if isinstance(target, tuple):
+                low, high = target
+                start = 0 if low is None else np.searchsorted(values, low, side='left')
+                stop = len(values) if high is None else np.searchsorted(values, high, side='right')
+            else:
+                start = np.searchsorted(values, target, side='left')
+                stop = np.searchsorted(values, target, side='right')
+            return np.sort(order[start:stop])
+        
+        if isinstance(target, tuple):
+            raise TypeError('range queries need a numeric column, %s is not' % column)
+        return index.get(target, np.zeros(0, dtype=np.int64))
+    
+    def index(self, column):
+        '''
+        Description:
+            It returns the index of a column, building it on the first use. Numeric columns get a sorted
+            index (the row positions sorted by value and the sorted values, without NaN) and the others 
+            a hash index (a dictionary mapping each value to the positions of its rows).
+            If self.data is changed, call dropIndexes.
+        Input:
+            column: The name of the column.
+        Output:
+            A tuple ('sorted', (positions, values)) or ('hash', {value: positions}).
+        '''
+        if column not in self.indexes:
+            values = self.data[column]
+            if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.to_numpy(dtype=np.float64)
+                order = np.argsort(values, kind='stable')
+                order = order[~np.isnan(values[order])]
+                self.indexes[column] = ('sorted', (order, values[order]))
+            else:
+                groups = values.reset_index(drop=True).groupby(values.values, sort=False, observed=True).indices
+                self.indexes[column] = ('hash', groups)
+        return self.indexes[column]
+    
+    def dropIndexes(self):
+        '''
+        Description: It discards the indexes, so they are built again from self.data.
+        '''
+        self.indexes = dict()
\ No newline at end of file
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-stage instrumentation. A stageMetrics object records, for each stage of a computation
+(parsing a file, splitting the dates, the daily aggregation, ...), its wall time, the rows
+processed and the peak memory above what was in use when it started. Stages opened inside
+another one are named after it ('load/parse').
+
+The memory is measured either as the resident set size of the process, whose peak is reset
+at each stage through /proc/self/clear_refs (Linux, almost free), or with tracemalloc, which
+counts the Python and numpy allocations exactly but makes parsing several times slower.
+
+The records of worker processes are collected with child() and merge(), and everything can be
+dumped to JSON and summarized per stage with pandas. When no metrics object is used the stages
+are null contexts, so the instrumented code runs at the same speed.
+"""
+
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+class stageMetrics:
+
+    def __init__(self, memory = True):
+        '''
+        Description: It creates an empty set of records.
+        Input:
+            memory: How the peak memory of each stage is measured: 'rss', 'tracemalloc' or False
+                    to not measure it. True means 'rss' where it is supported and 'tracemalloc' elsewhere.
+        '''
+        if memory is True:
+            memory = 'rss' if rssSupported() else 'tracemalloc'
+        self.memory = memory
+        self.records = list()
+        self.open = list()
+        self.tracing = False
+    
+    def child(self):
+        '''
+        Description: It returns an empty stageMetrics with the same settings, to be passed to a worker process.
+        '''
+        return stageMetrics(self.memory)
+    
+    def usage(self):
+        '''
+        Description: It returns the memory in use and its peak since the last reset, in bytes.
+        '''
+        if self.memory == 'rss':
+            return rssUsage()
+        return tracemalloc.get_traced_memory()
+    
+    def resetPeak(self):
+        '''
+        Description: It resets the peak memory to the memory in use.
+        '''
+        if self.memory == 'rss':
+            with open('/proc/self/clear_refs', 'w') as file:
+                file.write('5')
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracing = True
+            tracemalloc.reset_peak()
+    
+    def foldPeak(self):
+        '''
+        Description: It keeps the peak memory so far in the open stages, before it is reset.
+        '''
+        peak = self.usage()[1]
+        for record in self.open:
+            record['peak'] = max(record['peak'], peak)
+    
+    @contextmanager
+    def stage(self, name, file = None, rows = 0):
+        '''
+        Description:
+            A context manager that records a stage. It yields the record, a dictionary where the rows
+            can be set when they are only known at the end: record['rows'] = data.shape[0].
+        Input:
+            name: The name of the stage.
+            file: The file processed. If None, it is the file of the stage it is inside of.
+            rows: Number of rows processed.
+        '''
+        parent = self.open[-1] if self.open else None
+        if parent is not None:
+            name = parent['stage'] + '/' + name
+            if file is None:
+                file = parent['file']
+        record = {'stage': name, 'file': file, 'rows': rows, 'seconds': 0.0, 'peak': 0, 'pid': os.getpid()}
+        
+        if self.memory:
+            if self.open:
+                self.foldPeak()
+            self.resetPeak()
+            base = record['peak'] = self.usage()[0]
+        
+        self.open.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.memory:
+                self.foldPeak()
+                record['peak'] -= base
+            self.open.pop()
+            self.records.append(record)
+            if self.tracing and not self.open:
+                tracemalloc.stop()
+                self.tracing = False
+    
+    def merge(self, other):
+        '''
+        Description: It adds the records of another stageMetrics (of a worker process, for example) or a list of records.
+        '''
+        self.records += other.records if isinstance(other, stageMetrics) else list(other)
+        return self
+    
+    def summary(self, byFile = False):
+        '''
+        Description: It aggregates the records of each stage.
+        Input:
+            byFile: If True, the records are aggregated for each stage and file.
+        Output:
+            A pandas data frame with the columns stage, (file,) calls, seconds, rows, peak (the greatest one,
+            in bytes) and rows/s, sorted by seconds.
+        '''
+        import pandas as pd
+        
+        keys = ['stage', 'file'] if byFile else ['stage']
+        columns = keys + ['calls', 'seconds', 'rows', 'peak', 'rows/s']
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+        
+        records = pd.DataFrame(self.records)
+        summ = records.groupby(keys, sort=False, dropna=False).agg(calls=('seconds', 'size'), seconds=('seconds', 'sum'),
+                                                                    rows=('rows', 'sum'), peak=('peak', 'max')).reset_index()
+        summ['rows/s'] = summ['rows'] / summ['seconds']
+        return summ.sort_values('seconds', ascending=False, ignore_index=True)[columns]
+    
+    def dump(self, path):
+        '''
+        Description: It writes the records to a JSON file.
+        '''
+        with open(path, 'w') as file:
+            json.dump({'memory': self.memory, 'records': self.records}, file, indent=1)
+    
+    @classmethod
+    def load(cls, path):
+        '''
+        Description: It reads the records written by dump.
+        Output:
+            A new stageMetrics object.
+        '''
+        with open(path) as file:
+            content = json.load(file)
+        return cls(content['memory']).merge(content['records'])
+
+def rssUsage():
+    '''
+    Description: It returns the resident set size of the process and its peak, in bytes (Linux only).
+    '''
+    current = peak = 0
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                current = int(line.split()[1]) * 1024
+            elif line.startswith('VmHWM:'):
+                peak = int(line.split()[1]) * 1024
+    return current, peak
+
+def rssSupported():
+    '''
+    Description: It tells whether the peak resident set size can be reset and read (see stageMetrics).
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return rssUsage()[1] > 0
+    except OSError:
+        return False
+
+def stage(metrics, name, file = None, rows = 0):
+    '''
+    Description: It returns metrics.stage(name, file, rows), or a null context yielding a throwaway record if metrics is None.
+    '''
+    if metrics is None:
+        return nullcontext(dict())
+    return metrics.stage(name, file, rows)
@@ -48,17 +48,84 @@ stdoutHumCol = 'Outdoor Humidity Standard Deviation (%RH)'
 
 eventCol = 'Event'
 
+def loadReport(path, cache = None, compact = False, metrics = None, ragged = 'pad'):
+    '''
+    Description:
+        It parses an ecobee report in a worker process. It never raises, so one bad file
+        doesn't stop the others.
+    Input:
+        path: The report file path.
+        cache: A parseCache object or None.
+        compact: If True, the data frame is converted by compactFrame.
+        metrics: An empty stageMetrics object to record the stages, or None.
+        ragged: See ecobeeData.
+    Output:
+        A tuple (path, data frame, None, records) or (path, None, exception, records) if the file couldn't 
+        be parsed. records is the list of stage records (empty if metrics is None).
+    '''
+    records = metrics.records if metrics is not None else []
+    try:
+        return path, ecobeeData(cache = cache or False, compact = compact, metrics = metrics, ragged = ragged).loadDataFrame(path), None, records
+    except Exception as e:
+        return path, None, e, records
+
+def minuteOfDay(time):
+    '''
+    Description:
+        It converts a Time column to minutes since midnight. String values ('%H:%M:%S') are
+        parsed once for each distinct time, numeric values are assumed to be minutes already.
+    Input:
+        time: A pandas series with the times of the day.
+    Output:
+        A numpy array of integers.
+    '''
+    import pandas as pd
+    import numpy as np
+    
+    if pd.api.types.is_numeric_dtype(time):
+        return time.to_numpy(dtype=np.int64)
+    
+    codes, uniques = pd.factorize(time)
+    clock = [t.split(':') for t in uniques]
+    uMinutes = np.asarray([int(c[0])*60 + int(c[1]) for c in clock], dtype=np.int64)
+    return uMinutes[codes]
+
 class ecobeeData:
   
-    def __init__(self):
+    def __init__(self, cache = True, compact = False, metrics = None, ragged = 'pad'):
         '''
         Description: Initialize object with an empty dataframe.
+        Input:
+            cache: If True, the parsed reports are kept in the default on-disk cache (see ecobee.cache).
+                   It can also be a parseCache object, or False to always parse the files.
+            compact: If True, the loaded data is kept with compact types (see compactFrame).
+            metrics: A stageMetrics object (see ecobee.metrics) that records time, rows and peak memory 
+                     of each stage, or True to create one. If None, nothing is recorded.
+            ragged: What is done with the rows of a report with a wrong number of fields: 'pad' pads the 
+                    short ones with empty fields and leaves out the long ones, 'quarantine' leaves out all 
+                    of them (see ecobee.cleaner). Only the reports parsed with 'pad' are cached.
         '''
         
         import pandas as pd
+        from .cache import parseCache
+        from .metrics import stageMetrics
+        
+        if cache is True:
+            cache = parseCache()
+        if metrics is True:
+            metrics = stageMetrics()
+        self.cache = cache or None
+        self.compact = compact
+        self.metrics = metrics
+        self.ragged = ragged
         self.data = pd.DataFrame([])
         self.maxJulianDay = 0
         self.size = 0
+        
+        # summary state used by summarizeData(incremental = True)
+        self.summ = None
+        self.summarizedRows = 0
+        self.modifiedDays = set()
 
     def append(self, path):
         '''
@@ -68,23 +135,189 @@ class ecobeeData:
         Input:
             datframe: An ecobee data file path.
         '''
-        try:
-            newData = self.getDataFrame(path)
-        except FileNotFoundError:
-            return
+        with self.stage('append', path) as record:
+            try:
+                newData = self.loadDataFrame(path)
+            except FileNotFoundError:
+                return
+            
+            with self.stage('julianDays', rows = newData.shape[0]):
+                lastDay = self.data[julianDayCol].max() if self.size > 0 else 0
+                frames = [self.data, newData] if self.size > 0 else [newData]
+                self.shiftDays(newData, lastDay)
+            
+            with self.stage('concat') as concat:
+                self.data = self.concatFrames(frames)
+                record['rows'] = concat['rows'] = self.data.shape[0]
+    
+    def stage(self, name, file = None, rows = 0):
+        '''
+        Description: 
+            It returns a context manager that records a stage in self.metrics (see ecobee.metrics.stageMetrics.stage).
+            If self.metrics is None, it records nothing.
+        '''
+        from .metrics import stage
         
+        return stage(self.metrics, name, file, rows)
+    
+    def extend(self, paths, workers = None):
+        '''
+        Description:
+            It receives a list of ecobee data file paths, parses them concurrently in a process pool
+            and appends all of them to self.data with a single concatenation. The files are appended
+            in the order they are passed, with the same 'Days in Order' continuity as append.
+        Input:
+            paths: A list of ecobee data file paths.
+            workers: Number of worker processes. If None, it uses one per CPU. If 1, the files are parsed serially.
+        Output:
+            A dictionary mapping the path of each file that could not be loaded to the raised exception.
+        '''
+        from concurrent.futures import ProcessPoolExecutor
+        
+        paths = list(paths)
+        metrics = [self.metrics.child() if self.metrics is not None else None for path in paths]
+        if workers == 1 or len(paths) < 2:
+            results = [loadReport(path, self.cache, self.compact, m, self.ragged) for path, m in zip(paths, metrics)]
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(loadReport, paths, [self.cache]*len(paths), [self.compact]*len(paths), metrics,
+                                        [self.ragged]*len(paths)))
+        
+        with self.stage('extend') as record:
+            frames = [self.data] if self.size > 0 else []
+            lastDay = self.data[julianDayCol].max() if self.size > 0 else 0
+            failures = dict()
+            for path, newData, error, records in results:
+                if self.metrics is not None:
+                    self.metrics.merge(records)
+                if error is not None:
+                    print('Could not load %s: %s' % (path, repr(error)))
+                    failures[path] = error
+                    continue
+                
+                self.shiftDays(newData, lastDay)
+                lastDay = max(lastDay, newData[julianDayCol].max()) if self.size > 1 else newData[julianDayCol].max()
+                frames.append(newData)
+            
+            if frames:
+                with self.stage('concat') as concat:
+                    self.data = self.concatFrames(frames)
+                    concat['rows'] = self.data.shape[0]
+            record['rows'] = self.data.shape[0]
+        return failures
+    
+    def concatFrames(self, frames):
+        '''
+        Description:
+            It concatenates data frames like the ones from getDataFrame, keeping categorical columns
+            as categorical even if their categories differ between frames.
+        Input:
+            frames: A list of data frames.
+        Output:
+            A pandas data frame.
+        '''
+        import pandas as pd
+        
+        categorical = [c for f in frames for c in f.columns if isinstance(f[c].dtype, pd.CategoricalDtype)]
+        data = pd.concat(frames, ignore_index=True, sort=True)
+        for column in set(categorical):
+            if not isinstance(data[column].dtype, pd.CategoricalDtype):
+                data[column] = data[column].astype('category')
+        return data
+    
+    @classmethod
+    def fromFiles(cls, paths, workers = None, cache = True, compact = False, metrics = None, ragged = 'pad'):
+        '''
+        Description:
+            It creates a new object from a list of ecobee data file paths. See extend.
+        Input:
+            paths: A list of ecobee data file paths.
+            workers: Number of worker processes.
+            cache: See __init__.
+            compact: See __init__.
+            metrics: See __init__.
+            ragged: See __init__.
+        Output:
+            A new ecobeeData object. The files that could not be loaded are kept in its failures attribute.
+        '''
+        obj = cls(cache, compact, metrics, ragged)
+        obj.failures = obj.extend(paths, workers)
+        return obj
+    
+    @classmethod
+    def fromStore(cls, store, device, first = None, last = None, metrics = None):
+        '''
+        Description:
+            It creates a new object with the data of a device read from a fleet store (see ecobee.store),
+            without parsing any report. The data is in the compact layout and, if the device was stored in
+            a single run, its columns are memory maps of the store files, so summarizeData and the plots
+            read them directly. New reports can be appended after it.
+        Input:
+            store: A fleetStore object or the path of a store directory.
+            device: The device identifier.
+            first, last: The first and last days wanted (ordinals or datetime.date), or None for all of them.
+            metrics: See __init__.
+        Output:
+            A new ecobeeData object.
+        '''
+        from .store import fleetStore
+        
+        if not isinstance(store, fleetStore):
+            store = fleetStore(store)
+        
+        obj = cls(cache = False, compact = True, metrics = metrics)
+        with obj.stage('store', device) as record:
+            ranges = store.ranges(device, first, last)
+            obj.data = store.frame(device, first, last)
+            record['rows'] = obj.data.shape[0]
+        if ranges:
+            obj.size = len(ranges)
+            obj.maxJulianDay = int(store.index('dayOrdinal')[ranges[-1][3] - 1])
+        return obj
+    
+    def shiftDays(self, newData, lastDay):
+        '''
+        Description:
+            It shifts 'Days in Order' of a new data frame so it starts at 1 if self.data is empty,
+            or continues the days of self.data otherwise, keeping the gap between the last day appended
+            and the first new day.
+        Input:
+            newData: A data frame returned by getDataFrame.
+            lastDay: The greatest 'Days in Order' already in self.data.
+        '''
         nextMaxJulianDay = newData[julianDayCol].max()
         new_min = newData[julianDayCol].min()
         
         # shift all days in order to make the first day be 1
         newData[julianDayCol] -= new_min - 1 
         if self.size > 0:
-            newData[julianDayCol] += self.data[julianDayCol].max() + (new_min - self.maxJulianDay) - 1
+            newData[julianDayCol] += lastDay + (new_min - self.maxJulianDay) - 1
         
         self.maxJulianDay = nextMaxJulianDay
-        self.data = self.data.append(newData, ignore_index=True, sort=True)
         self.size += 1
  
+    def loadDataFrame(self, path):
+        '''
+        Description:
+            It returns the data frame of an ecobee report like getDataFrame, but reads it from 
+            the on-disk cache when the file was already parsed.
+        Input:
+            path: The report file path.
+        Output:
+            A pandas data frame.
+        '''
+        with self.stage('load', path) as record:
+            if self.cache is None or self.ragged != 'pad':
+                data = self.getDataFrame(path)
+            else:
+                data = self.cache.load(path, self.getDataFrame)
+            
+            if self.compact:
+                with self.stage('compact', rows = data.shape[0]):
+                    data = self.compactFrame(data)
+            record['rows'] = data.shape[0]
+        return data
+ 
     def getDataFrame(self, path):
         '''
         Description: It creates a data frame from a ecobee report csv table and includes new columns as the following:
@@ -97,74 +330,181 @@ class ecobeeData:
         It also converts temperature from fahrenheit to celsius, cast temperatures and humidities from string to numeric, 
         and calculates 'julian day' for each day.
           
-        Obs: This function doesn't solve problems like incorrect number of columns or rows. If there is any problem like these, it is needed
-        to treat them before this function call.
+        Comment ('#') and blank lines are left out, and the rows with a wrong number of fields are padded or
+        left out as set by self.ragged. These rows are written with their line numbers to a side file 
+        (see ecobee.cleaner.badRowsPath).
         
         Input:
-          path: The report file path.
+          path: The report file path. It can be a csv, a .gz or .zip file, or a report inside a zip
+                with many of them (see ecobee.archive).
           
         Output:
           A pandas data frame.
         '''
         
+        import pandas as pd
+        from .cleaner import openCleanReport
+        
+        with self.stage('parse', path) as record:
+            with openCleanReport(path, self.ragged) as file:
+                data = pd.read_csv(file)
+                self.reportCleaning(path, file.cleaner)
+            record['rows'] = data.shape[0]
+        
+        return self.prepareFrame(data)
+    
+    def prepareFrame(self, data):
+        '''
+        Description:
+            It turns the raw table of an ecobee report (or a chunk of it) into the data frame
+            returned by getDataFrame: it adds the date columns, casts temperatures and humidities
+            to numeric and converts temperatures from fahrenheit to celsius.
+        Input:
+            data: A data frame with the columns of an ecobee report.
+        Output:
+            The same data frame with the new columns.
+        '''
+        import pandas as pd
+        
+        data.rename(columns={'RH_out\n':'RH_out'}, inplace=True)
+        
+        with self.stage('splitDateTime', rows = data.shape[0]):
+            data = self.splitDateTime(data)
+        
+        with self.stage('convert', rows = data.shape[0]):
+            # cast these columns from str to numeric
+            data[outTemCol]  = pd.to_numeric(data[outTemCol], errors='coerce')
+            data[inHumCol]  = pd.to_numeric(data[inHumCol], errors='coerce')
+            data[inTemCol] = pd.to_numeric(data[inTemCol], errors='coerce')
+            data[outHumCol]   = pd.to_numeric(data[outHumCol], errors='coerce')
+            
+            # convert temperature from fahrenheit to celsius
+            data[outTemCol]  = (data[outTemCol]  - 32) * (5/9)
+            data[inTemCol] = (data[inTemCol] - 32) * (5/9)
+        
+        return data
+    
+    def compactFrame(self, data):
+        '''
+        Description:
+            It converts a data frame from getDataFrame to compact types, which take several times less memory:
+              DateTime      -> the full timestamp as datetime64 (Year, Month and Day are dropped)
+              Time          -> int16 minutes since midnight
+              Days in Order -> int32
+              float columns -> float32
+              text columns  -> categorical (HvacMode, Event, ...)
+            The other methods of ecobeeData work on both representations.
+        Input:
+            data: A data frame returned by getDataFrame.
+        Output:
+            The converted data frame.
+        '''
+        import pandas as pd
+        import numpy as np
+        
+        if pd.api.types.is_datetime64_any_dtype(data[dateCol]):
+            return data
+        
+        # seconds since midnight, parsed once for each distinct time
+        codes, uniques = pd.factorize(data[timeCol])
+        clock = [t.split(':') for t in uniques]
+        seconds = np.asarray([int(c[0])*3600 + int(c[1])*60 + int(c[2]) for c in clock], dtype=np.int64)[codes]
+        
+        days = pd.to_datetime(data[dateCol], format='%Y-%m-%d').values
+        data[dateCol] = days + seconds.astype('timedelta64[s]')
+        data[timeCol] = (seconds // 60).astype(np.int16)
+        data = data.drop(columns=[yearCol, monthCol, dayCol])
+        data[julianDayCol] = data[julianDayCol].astype(np.int32)
+        
+        for column in data.columns:
+            dtype = data[column].dtype
+            if dtype == np.float64:
+                data[column] = data[column].astype(np.float32)
+            elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+                data[column] = data[column].astype('category')
+        return data
+    
+    def compactData(self):
+        '''
+        Description:
+            It converts self.data to compact types (see compactFrame) and keeps loading new data that way.
+        Output:
+            A tuple with the memory used by self.data before and after, in bytes.
+        '''
+        before = self.data.memory_usage(deep=True).sum()
+        self.data = self.compactFrame(self.data)
+        self.compact = True
+        return before, self.data.memory_usage(deep=True).sum()
+    
+    def readChunks(self, path, chunkSize = 100000):
+        '''
+        Description:
+            It reads an ecobee report in chunks of rows, so the whole file is never in memory.
+            Each chunk is prepared like the data frame returned by getDataFrame, and the report is
+            cleaned the same way.
+        Input:
+            path: The report file path.
+            chunkSize: Number of rows of each chunk.
+        Output:
+            A generator of pandas data frames.
+        '''
+        import pandas as pd
+        from .cleaner import openCleanReport
+        
+        with openCleanReport(path, self.ragged) as file, pd.read_csv(file, chunksize=chunkSize) as reader:
+            for chunk in reader:
+                yield self.prepareFrame(chunk)
+            self.reportCleaning(path, file.cleaner)
+    
+    def reportCleaning(self, path, cleaner):
+        '''
+        Description: It prints what was left out or fixed in a report by a reportCleaner, if it has ragged rows.
+        '''
+        from .cleaner import badRowsPath
+        
+        if cleaner.counts['padded'] or cleaner.counts['quarantined']:
+            print('%s: %s (see %s)' % (path, cleaner.report(), badRowsPath(path)))
+    
+    def splitDateTime(self, data):
+        '''
+        Description:
+            It parses the DateTime column once into native timestamps and derives the
+            date, time, year, month, day and 'julian day' columns with array operations.
+            DateTime keeps the date string ('%Y-%m-%d'), Time gets the time string ('%H:%M:%S'),
+            Year, Month and Day are uint16 and Days in Order is the proleptic Gregorian ordinal of the day.
+        Input:
+            data: A data frame with a DateTime column formatted as '%Y-%m-%d %H:%M:%S'.
+        Output:
+            The same data frame with the new columns.
+        '''
         import pandas as pd
         import numpy as np
         import datetime as dt
         
-        try:
-            data = pd.read_csv(path)
-        except pd.errors.ParserError:
-            # just open file and read the data
-            file = open(path, 'r')
-            rawData = file.readlines()
-            file.close()
-          
-            # clean up the data removing empty rows and commentaries
-            i = 0;
-            while i < len(rawData):
-                if '#' in rawData[i] or '\n' == rawData[i] or '' == rawData[i]:
-                    data.pop(i)
-                else:
-                    i+=1
-
-            columns = rawData[0].split(',')
-            try:
-                data = pd.DataFrame([line.split(',') for line in rawData[1:]], columns=columns)
-            except ValueError as e:
-                import sys
-                print(e)
-                sys.exit()
-              
-        data.rename(columns={'RH_out\n':'RH_out'}, inplace=True)
-          
-        #split datetime into date and time columns
-        datetime = np.asarray([d.split(' ') for d in data[dateCol]], dtype='str')
-        data[dateCol] = datetime[:,0]
-        data[timeCol] = datetime[:,1]
-          
-        # get year month and day from Date
-        date = np.asarray([d.split('-') for d in data[dateCol]], dtype='uint16')
-          
-        # create new coluns
-        data[yearCol]  = date[:,0]
-        data[monthCol] = date[:,1]
-        data[dayCol]   = date[:,2]
-        data[julianDayCol] = 0
-          
-        # cast these columns from str to numeric
-        data[outTemCol]  = pd.to_numeric(data[outTemCol], errors='coerce')
-        data[inHumCol]  = pd.to_numeric(data[inHumCol], errors='coerce')
-        data[inTemCol] = pd.to_numeric(data[inTemCol], errors='coerce')
-        data[outHumCol]   = pd.to_numeric(data[outHumCol], errors='coerce')
-          
-        # convert temperature from fahrenheit to celsius
-        data[outTemCol]  = (data[outTemCol]  - 32) * (5/9)
-        data[inTemCol] = (data[inTemCol] - 32) * (5/9)
-        
-        # get Julian Day
-        for date in data[dateCol].unique():
-            d = dt.datetime.strptime(date, "%Y-%m-%d") # get datetime object
-            data.loc[ (data[yearCol] == d.year) & (data[monthCol] == d.month) & (data[dayCol] == d.day), julianDayCol] = dt.date(d.year,d.month,d.day).toordinal()
+        stamps = pd.to_datetime(data[dateCol], format='%Y-%m-%d %H:%M:%S').values
+        
+        # days since the epoch and seconds since midnight
+        days = stamps.astype('datetime64[D]')
+        seconds = (stamps - days).astype('timedelta64[s]').astype(np.int64)
+        
+        # format each distinct day and time only once
+        uDays, dayIdx = np.unique(days, return_inverse=True)
+        uSecs, secIdx = np.unique(seconds, return_inverse=True)
+        dayStr = np.datetime_as_string(uDays, unit='D').astype(object)
+        secStr = np.asarray(['%02d:%02d:%02d' % (s // 3600, s % 3600 // 60, s % 60) for s in uSecs], dtype=object)
+        
+        data[dateCol] = dayStr[dayIdx.ravel()]
+        data[timeCol] = secStr[secIdx.ravel()]
+        
+        # get year month and day from the day of each row
+        years = days.astype('datetime64[Y]')
+        months = days.astype('datetime64[M]')
+        data[yearCol]  = (years.astype(np.int64) + 1970).astype('uint16')
+        data[monthCol] = (months - years).astype(np.int64).astype('uint16') + 1
+        data[dayCol]   = (days - months).astype(np.int64).astype('uint16') + 1
+        
+        # get Julian Day as the ordinal of each day
+        data[julianDayCol] = days.astype(np.int64) + dt.date(1970, 1, 1).toordinal()
         return data
     
     def getMaxMin(self, column):
@@ -180,15 +520,7 @@ class ecobeeData:
                 
             returning list := [[max1,min1], [max2,min2], ...,[maxN,minN]]
         '''
-        import numpy as np
-        
-        data = self.data.copy()
-        
-        mxmn_list = list()
-        for day in data[julianDayCol].unique():
-            d = data[data[julianDayCol] == day] 
-            mxmn_list.append([round(np.max(d[column]),2), round(np.min(d[column]),2)])
-        return mxmn_list
+        return self.dailyStats([column])[column][['max', 'min']].values.tolist()
     
     def getMean(self, column):
         '''
@@ -203,15 +535,36 @@ class ecobeeData:
 
             returning list := [[mean1,stddev1], [mean2,stddev2], ...,[meanN,stddevN]]
         '''
+        return self.dailyStats([column])[column][['mean', 'std']].values.tolist()
+    
+    def dailyStats(self, columns, data = None):
+        '''
+        Description:
+            It computes mean, standard deviation, max and min values of the specified columns for each day
+            in a single grouped pass over the data, without copying it. NaN values are skipped and the
+            standard deviation is the population one (ddof = 0). Values are rounded to 2 decimals.
+        Input:
+            columns: A list with the names of the columns of interest.
+            data: The data frame to be used. If None, it will be used self.data.
+        Output:
+            A data frame indexed by 'Days in Order', in order of first appearance, and with the columns
+            (column, 'mean'), (column, 'std'), (column, 'max') and (column, 'min') for each column passed.
+        '''
+        import pandas as pd
         import numpy as np
         
-        data = self.data.copy()
+        if data is None:
+            data = self.data
         
-        mean_list = list()
-        for day in data[julianDayCol].unique():
-            d = data[data[julianDayCol] == day]
-            mean_list.append([round(np.mean(d[column]), 2), round(np.std(d[column]), 2)])
-        return mean_list
+        grouped = data.groupby(julianDayCol, sort=False)[columns]
+        stats = pd.concat({'mean': grouped.mean(), 
+                           'std':  grouped.std(ddof=0), 
+                           'max':  grouped.max(), 
+                           'min':  grouped.min()}, axis=1)
+        
+        # swap levels to (column, statistic) 
+        stats = stats.swaplevel(axis=1)[[(c, st) for c in columns for st in ['mean', 'std', 'max', 'min']]]
+        return stats.astype(np.float64).round(2)
     
     def getTimeOn(self):
         '''
@@ -222,40 +575,79 @@ class ecobeeData:
         Output:
             A list with each time that the device was left on mode on for each day.
         '''
+        with self.stage('timeOn', rows = self.data.shape[0]):
+            return self.timeOnByDay().tolist()
+    
+    def timeOnByDay(self, byMode = False, data = None):
+        '''
+        Description:
+            It computes, in one pass over the whole data, how many minutes the device was left on
+            mode on for each day. A period on starts at a row whose mode isn't "off" and lasts until the
+            next row of the same day (the next "off" row or a change of mode), or until the end of
+            the day (1440 minutes) if there isn't one. Only hours and minutes of the Time column are used.
+        Input:
+            byMode: If True, it also returns the minutes spent on each mode (heat, cool, auto, ...).
+            data: The data frame to be used. If None, it will be used self.data.
+        Output:
+            A pandas series with the minutes on for each day, indexed by 'Days in Order' in order of
+            first appearance. If byMode is True, a data frame with one column for each mode and
+            the total on column 'Time on (min)'.
+        '''
+        import pandas as pd
+        import numpy as np
         
-        data = self.data.copy()
-        
-        count_list = list()
-        for day in data[julianDayCol].unique():
-            d = data[data[julianDayCol] == day]
-            modes = d[systemModeCol].values
-            clock = d[timeCol].values
-            clock = [x.split(':') for x in clock]
-            
-            count = 0
-            i = 0
-            while i < len(modes):
-                if modes[i]!= "off":
-                    b = int(clock[i][0])*60 + int(clock[i][1])
-                    i+=1
-                    while i < len(modes) and modes[i]!= "off":
-                        i+=1
-                    if i < len(modes):
-                        a = int(clock[i][0])*60 + int(clock[i][1])
-                    else:
-                        a = 1440
-                        
-                    count += a - b
-                i+=1
-            
-            count_list.append(count)
-        return count_list
+        if data is None:
+            data = self.data
+        
+        dayCodes, days = pd.factorize(data[julianDayCol])
+        modeCodes, modes = pd.factorize(data[systemModeCol])
+        minutes = minuteOfDay(data[timeCol])
+        
+        # group the rows of each day keeping their order
+        order = np.argsort(dayCodes, kind='stable')
+        dayCodes, modeCodes, minutes = dayCodes[order], modeCodes[order], minutes[order]
+        
+        # rows with an unknown mode (code -1) are on as well
+        offCode = modes.get_loc('off') if 'off' in modes else -2
+        on = modeCodes != offCode
+        
+        # a period is a run of rows on with the same mode inside the same day
+        sameDayNext = np.r_[dayCodes[1:] == dayCodes[:-1], False]
+        sameNext = sameDayNext & np.r_[on[1:] & (modeCodes[1:] == modeCodes[:-1]), False]
+        sameBefore = np.r_[False, sameNext[:-1]]
+        starts = np.flatnonzero(on & ~sameBefore)
+        ends = np.flatnonzero(on & ~sameNext)
+        
+        # each period ends at the next row of the same day or at the end of the day
+        stop = np.where(sameDayNext[ends], minutes[np.minimum(ends + 1, len(minutes) - 1)], 1440)
+        duration = stop - minutes[starts]
+        
+        total = np.bincount(dayCodes[starts], weights=duration, minlength=len(days)).astype(np.int64)
+        total = pd.Series(total, index=pd.Index(days, name=julianDayCol), name=timeDeviceOnCol)
+        if not byMode:
+            return total
+        
+        perMode = np.zeros((len(days), len(modes)), dtype=np.int64)
+        known = modeCodes[starts] >= 0
+        np.add.at(perMode, (dayCodes[starts][known], modeCodes[starts][known]), duration[known])
+        
+        perMode = pd.DataFrame(perMode, index=total.index, columns=list(modes))
+        perMode = perMode.drop(columns=['off'], errors='ignore').sort_index(axis=1)
+        perMode[timeDeviceOnCol] = total
+        return perMode
     
-    def summarizeData(self):
+    def summarizeData(self, incremental = False):
         '''
         Description:
             It computes mean, standard deviation, max and min values from Outdoor and Indoor measures. 
             It returns a new dataframe with these values.
+            
+            If incremental is True and self.summ was already computed, only the days of the rows appended
+            since the last call (and the days passed to markModified) are summarized again and merged into
+            self.summ, which is kept ordered by 'Days in Order'. The new rows are expected to come after the
+            rows already summarized, as append and extend do.
+        Input:
+            incremental: If True, it updates self.summ instead of computing it from scratch.
 
         Output:
             A simplified data frame containing mean, standard deviation, max, and
@@ -264,76 +656,204 @@ class ecobeeData:
         import pandas as pd
         import numpy as np
         
-        data = self.data.copy()
+        with self.stage('summarize') as record:
+            if not incremental or self.summ is None or self.summarizedRows > self.data.shape[0]:
+                record['rows'] = self.data.shape[0]
+                self.summ = self.summaryFrame(self.data)
+            else:
+                days = self.data[julianDayCol].values
+                
+                # rows appended after the last summary, including the rest of its last day
+                first = self.summarizedRows
+                newDays = set(np.unique(days[first:]))
+                while first > 0 and days[first - 1] in newDays:
+                    first -= 1
+                
+                if self.modifiedDays:
+                    newDays |= self.modifiedDays
+                    rows = self.data[self.data[julianDayCol].isin(newDays)]
+                else:
+                    rows = self.data.iloc[first:]
+                
+                if newDays:
+                    record['rows'] = rows.shape[0]
+                    summ = self.summ[~self.summ[julianDayCol].isin(newDays)]
+                    summ = pd.concat([summ, self.summaryFrame(rows)], ignore_index=True)
+                    self.summ = summ.sort_values(julianDayCol, kind='stable', ignore_index=True)
+        
+        self.summarizedRows = self.data.shape[0]
+        self.modifiedDays = set()
+    
+    def markModified(self, days):
+        '''
+        Description:
+            It marks days whose rows in self.data were changed, so the next 
+            summarizeData(incremental = True) summarizes them again.
+        Input:
+            days: A list with the values of 'Days in Order' that were changed.
+        '''
+        self.modifiedDays.update(days)
+    
+    def summaryFrame(self, data):
+        '''
+        Description:
+            It computes the daily summary of summarizeData for the data frame passed.
+        Input:
+            data: A data frame with the columns of self.data.
+        Output:
+            A data frame with one row for each day.
+        '''
+        import pandas as pd
+        import numpy as np
         
         columns= [outTemCol, inTemCol, inHumCol, outHumCol]
         
-        meanv = list()
-        mxmnv = list()
-        for c in columns:
-            meanv.append(np.asarray(self.getMean(c)))
-            mxmnv.append(np.asarray(self.getMaxMin(c)))
-        
-        tmOn = np.asarray([self.getTimeOn()])
-        days = np.asarray([data[julianDayCol].unique()])
+        with self.stage('dailyStats', rows = data.shape[0]):
+            stats = self.dailyStats(columns, data)
+            meanv = stats[[(c, st) for c in columns for st in ['mean', 'std']]].values
+            mxmnv = stats[[(c, st) for c in columns for st in ['max', 'min']]].values
         
-        meanv = np.concatenate((meanv[:]), axis=1)
-        mxmnv = np.concatenate((mxmnv[:]), axis=1)
+        with self.stage('timeOn', rows = data.shape[0]):
+            tmOn = np.asarray([self.timeOnByDay(data = data).values])
+        days = np.asarray([stats.index.values])
         
         values = np.concatenate((days.T,meanv,mxmnv,tmOn.T), axis=1)
         
+        return pd.DataFrame(values, columns = self.summaryColumns())
+    
+    @staticmethod
+    def summaryColumns():
+        '''
+        Description:
+            It returns the names of the columns of self.summ, in order.
+        '''
+        return [julianDayCol, 
+                meanOutTemCol, stdOutTemCol,
+                meanInTemCol, stdInTemCol,
+                meanInHumCol, stdInHumCol,
+                meanOutHumCol, stdoutHumCol,
+                maxOutTemCol, minOutTemCol,
+                maxInTemCol, minInTemCol,
+                maxInHumCol, minInHumCol,
+                outHumColMax, minOutHumCol,
+                timeDeviceOnCol]
+    
+    def summarizeStream(self, paths, chunkSize = 100000):
+        '''
+        Description:
+            It computes the same self.summ as summarizeData from one or more report files, without 
+            loading them into self.data. Each file is read in chunks and every complete day is summarized
+            as soon as it is read, so the memory used doesn't depend on the size of the files. The rows
+            of the last day of a chunk are kept and merged with the next chunk. The files are expected
+            to be in chronological order, like the ecobee reports. 'Days in Order' is shifted like append does.
+            If no rows are read, self.summ is an empty data frame with the summary columns. As self.summ
+            doesn't come from self.data, the next summarizeData(incremental = True) summarizes all of self.data.
+        Input:
+            paths: A report file path or a list of them.
+            chunkSize: Number of rows read at a time.
+        '''
+        import pandas as pd
+        import numpy as np
         
-        cln_columns = [julianDayCol, 
-                      meanOutTemCol, stdOutTemCol,
-                      meanInTemCol, stdInTemCol,
-                      meanInHumCol, stdInHumCol,
-                      meanOutHumCol, stdoutHumCol,
-                      maxOutTemCol, minOutTemCol,
-                      maxInTemCol, minInTemCol,
-                      maxInHumCol, minInHumCol,
-                      outHumColMax, minOutHumCol,
-                      timeDeviceOnCol]
+        if isinstance(paths, str):
+            paths = [paths]
+        
+        summaries = list()
+        lastDay = 0
+        lastOrdinal = None
+        for path in paths:
+            fileSumm = list()
+            pending = None
+            for chunk in self.readChunks(path, chunkSize):
+                if chunk.empty:
+                    continue
+                if pending is not None:
+                    chunk = pd.concat([pending, chunk], ignore_index=True)
+                
+                # the last day may continue on the next chunk
+                tail = (chunk[julianDayCol] == chunk[julianDayCol].iloc[-1]).values
+                pending = chunk[tail]
+                if not tail.all():
+                    fileSumm.append(self.summaryFrame(chunk[~tail]))
+            if pending is not None:
+                fileSumm.append(self.summaryFrame(pending))
+            if not fileSumm:
+                continue
+            
+            summ = pd.concat(fileSumm, ignore_index=True)
+            first, last = summ[julianDayCol].min(), summ[julianDayCol].max()
+            
+            # shift days as append does
+            summ[julianDayCol] -= first - 1
+            if lastOrdinal is not None:
+                summ[julianDayCol] += lastDay + (first - lastOrdinal) - 1
+            lastOrdinal = last
+            lastDay = max(lastDay, summ[julianDayCol].max())
+            summaries.append(summ)
+        
+        if summaries:
+            self.summ = pd.concat(summaries, ignore_index=True)
+        else:
+            columns = self.summaryColumns()
+            self.summ = pd.DataFrame(np.empty((0, len(columns))), columns = columns)
+        self.summarizedRows = 0
+        self.modifiedDays = set()
+    
+    def binnedStats(self, valueCol = timeDeviceOnCol, binCol = meanOutTemCol, edges = None, width = 5, 
+                    closed = 'left', quantiles = ()):
+        '''
+        Description:
+            It computes count, mean, standard deviation and quantiles of a column of self.summ for each
+            bin of another column. See ecobee.binning.binnedStats.
+        Input:
+            valueCol: The name of the column to be summarized.
+            binCol: The name of the column to be binned.
+            edges: The bin edges. If None, bins of the given width are used.
+            width: The width of the bins when edges is None.
+            closed: 'left', 'right' or 'neither'.
+            quantiles: A list of quantiles to be computed, between 0 and 1.
+        Output:
+            A data frame with one row for each bin.
+        '''
+        from .binning import binnedStats
         
-        self.summ = pd.DataFrame(values, columns = cln_columns)
+        return binnedStats(self.summ, valueCol, binCol, edges, width, closed, quantiles)
     
-    def plotTxD(self):
+    def plotTxD(self, ax = None):
         '''
         Description:
             It plot the relation between the temperature bands and the mean time 
             that the user let the device on mode on. Each band has a width of 5 Celsius degrees.
             If there is a point for temperature T, it means that the mean time left on mode on 
             from T-5 to T celsius degrees is represented by this point.
+        Input:
+            ax: Matplotlib axes to draw on. If None, a new figure is created and shown.
         '''
         import matplotlib.pyplot as plt
         import numpy as np
         
-        data = self.summ.copy()
-        
         # get boundaries and bands
-        min_t = data[meanOutTemCol].min()
-        max_t = data[meanOutTemCol].max()
+        min_t = self.summ[meanOutTemCol].min()
+        max_t = self.summ[meanOutTemCol].max()
         temp = np.arange(min_t+5,max_t+5,5)
-        mean = []
-        std = []
-        
-        # get mean time on and the respectives standard deviations
-        for t in temp:
-            f = data.loc[(data[meanOutTemCol] < t) & (data[meanOutTemCol] > t - 5), timeDeviceOnCol]
-            mean.append(f.sum()/(f.size*60.0))
-            std.append(np.std(np.asarray(f)/60.0))
+        
+        # get mean time on and the respectives standard deviations, in hours
+        stats = self.binnedStats(edges = np.r_[temp[0] - 5, temp], closed = 'neither')
                 
         x = temp
-        y = mean
-        e = std
+        y = stats['mean'].values/60.0
+        e = stats['std'].values/60.0
         
-        fig = plt.figure(figsize = (16,12))
-        ax = fig.add_subplot(1, 1, 1)
+        show = ax is None
+        if show:
+            fig = plt.figure(figsize = (16,12))
+            ax = fig.add_subplot(1, 1, 1)
         
         ax.set_xlabel('Mean Temperature Band (C)')
         ax.set_ylabel('Device On Mean Time (hours/day)')
         
         # Major ticks every 20, minor ticks every 1
-        major_ticks = np.arange(0, int(np.max(y))+int(np.max(e) + 50 ), 20)
+        major_ticks = np.arange(0, int(np.nanmax(y))+int(np.nanmax(e) + 50 ), 20)
         minor_ticks = np.arange(int(min_t)-5, int(max_t)+5, 1)
         
         ax.set_xticks(minor_ticks, minor=True)
@@ -342,8 +862,9 @@ class ecobeeData:
         ax.grid(which='minor', alpha=1)
         ax.grid(which='major', alpha=0.5)
         
-        plt.errorbar(x, y, yerr = e, ecolor = 'r', linestyle='None', marker='d')
-        plt.show()
+        ax.errorbar(x, y, yerr = e, ecolor = 'r', linestyle='None', marker='d')
+        if show:
+            plt.show()
         
     def plotComparison(self, 
                     summ = False,
@@ -352,7 +873,9 @@ class ecobeeData:
                     y1label = 'Outdoor', 
                     y2label = 'Indoor', 
                     title   = "Outdoor x Indoor", 
-                    columns = [meanOutTemCol, meanInTemCol, julianDayCol]):
+                    columns = [meanOutTemCol, meanInTemCol, julianDayCol],
+                    lod = 'minmax',
+                    ax = None):
         '''
         Description:
             It plot two different measurements to make a comparison.
@@ -364,10 +887,12 @@ class ecobeeData:
             y1label: legend for the 1st measurement
             y2label: legend for the 2nd measurement
             title: title for the plot
+            lod: Level of detail of the lines, 'minmax', 'lttb' or None to plot all the points (see ecobee.downsample).
+            ax: Matplotlib axes to draw on. If None, a new figure is created and shown.
         '''
         import matplotlib.pyplot as plt
-        import pylab as pl
         import numpy as np
+        from ecobee.downsample import lodIndices, axesWidth
         
         if summ:
             dataframe = self.summ
@@ -383,8 +908,10 @@ class ecobeeData:
         fltr = ~np.isnan(y2)
         y1, y2, t = y1[fltr], y2[fltr], t[fltr]
         
-        fig = plt.figure(figsize = (16,12))
-        ax = fig.add_subplot(1, 1, 1)
+        show = ax is None
+        if show:
+            fig = plt.figure(figsize = (16,12))
+            ax = fig.add_subplot(1, 1, 1)
         
         ax.set_xlabel(xlabel)
         ax.set_ylabel(ylabel)
@@ -401,11 +928,15 @@ class ecobeeData:
         
         ax.grid(which='both')
         
+        keep = lodIndices(t, [y1, y2], axesWidth(ax), lod)
+        y1, y2, t = y1[keep], y2[keep], t[keep]
+        
         ax.plot(t, y1, 'darkblue', linestyle='--', label = y1label, marker='o')
         ax.plot(t, y2, 'lime', linestyle='--', label = y2label , marker='o')
-        pl.legend(loc='lower right')
-        pl.title(title)
-        plt.show()  
+        ax.legend(loc='lower right')
+        ax.set_title(title)
+        if show:
+            plt.show()
         
     def animatedPlot(self,
                     fileName,
@@ -421,7 +952,9 @@ class ecobeeData:
                     y1label= "", 
                     xlabel = "", 
                     ylabel = "", 
-                    title = ""):
+                    title = "",
+                    workers = None,
+                    lod = 'minmax'):
         '''
         Description:
             It plot an animated plot of two different measurements to make a comparison.
@@ -439,6 +972,10 @@ class ecobeeData:
             y1label: legend for the 1st measurement
             y2label: legend for the 2nd measurement
             title: title for the plot
+            workers: If it isn't None, the frames are rendered without a window by this number of processes
+                     (0 means one per CPU) and the video is saved without showing the plot. 
+                     fileName may end with .gif.
+            lod: Level of detail of the lines, 'minmax', 'lttb' or None to plot all the points (see ecobee.downsample).
         '''
         
         import matplotlib.pyplot as plt
@@ -446,6 +983,7 @@ class ecobeeData:
         import pylab as pl
         import numpy as np
         import pandas as pd
+        from ecobee.downsample import lodIndices, axesWidth
         
         if type(dataframe) != pd.core.frame.DataFrame:
             if summ:
@@ -465,6 +1003,13 @@ class ecobeeData:
         if 'Time' in columns[2]:
             t = t - t.min()
         
+        if workers is not None:
+            from ecobee.animation import slidingScene, renderAnimation
+            
+            scene = slidingScene(t, y1, y2, step, y1label, y2label, xlabel, ylabel, title, lod = lod)
+            renderAnimation(scene, fileName, nFrames, fps = nfps, workers = workers)
+            return
+        
         fig = plt.figure(figsize = (24,16))
         ax = fig.add_subplot(1, 1, 1)
         
@@ -490,10 +1035,13 @@ class ecobeeData:
             line[1].set_ydata([np.nan]*step)
             return line
         
+        width = axesWidth(ax)
+        
         def animate(i):
             if len(y1[i: i+step]) == step:
-                line[0].set_ydata(y1[i:i + step])
-                line[1].set_ydata(y2[i:i + step])
+                keep = lodIndices(t[:step], [y1[i:i + step], y2[i:i + step]], width, lod)
+                line[0].set_data(t[:step][keep], y1[i:i + step][keep])
+                line[1].set_data(t[:step][keep], y2[i:i + step][keep])
             return line
             
         ani = animation.FuncAnimation(
@@ -517,7 +1065,9 @@ class ecobeeData:
                         y1label= "", 
                         xlabel = "", 
                         ylabel = "", 
-                        title = ""):
+                        title = "",
+                        workers = None,
+                        lod = 'minmax'):
         '''
         Description:
             It plot an animated plot of two different measurements to make a comparison.
@@ -535,6 +1085,10 @@ class ecobeeData:
             y1label: legend for the 1st measurement
             y2label: legend for the 2nd measurement
             title: title for the plot
+            workers: If it isn't None, the frames are rendered without a window by this number of processes
+                     (0 means one per CPU) and the video is saved without showing the plot. 
+                     fileName may end with .gif.
+            lod: Level of detail of the lines, 'minmax', 'lttb' or None to plot all the points (see ecobee.downsample).
         '''
         
         import matplotlib.pyplot as plt
@@ -542,6 +1096,7 @@ class ecobeeData:
         import pylab as pl
         import numpy as np
         import pandas as pd
+        from ecobee.downsample import lodIndices, axesWidth
         
         if type(dataframe) != pd.core.frame.DataFrame:
             if summ:
@@ -561,15 +1116,24 @@ class ecobeeData:
         if 'Time' in columns[2]:
             t = t - t.min()
         
+        if workers is not None:
+            from ecobee.animation import growingScene, renderAnimation
+            
+            scene = growingScene(t, y1, y2, step, y1label, y2label, xlabel, ylabel, title, lod = lod)
+            renderAnimation(scene, fileName, nFrames, fps = nfps, workers = workers)
+            return
+        
         fig = plt.figure(figsize = (24,16))
         ax = fig.add_subplot(1, 1, 1)
     
         ax.set_xlabel(xlabel)
         ax.set_ylabel(ylabel)
     
+        keep = lodIndices(t, [y1, y2], axesWidth(ax), lod)
+        
         line = list()
-        ax1, = ax.plot(t, y1, 'darkblue', label = y1label)
-        ax2, = ax.plot(t, y2, 'lime', label = y2label)
+        ax1, = ax.plot(t[keep], y1[keep], 'darkblue', label = y1label)
+        ax2, = ax.plot(t[keep], y2[keep], 'lime', label = y2label)
         line.append(ax1)
         line.append(ax2)
         pl.legend(loc='lower right')
@@ -581,8 +1145,9 @@ class ecobeeData:
             return line
     
         def animate(i):
-            line[0].set_data(t[:i*step], y1[:i*step])
-            line[1].set_data(t[:i*step], y2[:i*step])
+            shown = keep[:np.searchsorted(keep, i*step)]
+            line[0].set_data(t[shown], y1[shown])
+            line[1].set_data(t[shown], y2[shown])
             return line
     
         ani = animation.FuncAnimation(
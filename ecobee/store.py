@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar store of the cleaned reports of a whole fleet, read through memory maps.
+
+The data frames of ecobeeData (in the compact layout, see ecobeeData.compactFrame) of every
+device are packed into one raw binary file for each column, so a device or a range of days is
+read without parsing anything: its columns are slices of numpy memory maps. Two indexes are kept
+besides the columns:
+    runs: one entry for each report added, with its device and its first row and first day.
+          The runs of a device are its per-device offset index.
+    days: one entry for each day of each run, with its ordinal ('Days in Order' of getDataFrame)
+          and its first row.
+The rows of a run go from its first row to the first row of the next run, and the same for days.
+
+New reports (of a new year, for example) are appended to the end of the files, so the rows of a
+device whose reports were added at different times are split in several runs. A device with a
+single run is read without copying; repack() rewrites the store with the runs of each device
+together. Everything written is only seen after commit() updates store.json, so a crash leaves
+the store as it was at the last commit. The store has a single writer.
+
+Layout of a store directory:
+    store.json                 columns, categories, devices, sources and committed lengths
+    columns/<n>.bin            one file for each column (a column whose codes are widened gets a new one)
+    runs/{device,row,day}.bin  the runs index
+    days/{ordinal,row}.bin     the days index
+
+Usage from the command line (run it again with new --years to append them):
+    python -m ecobee.store --metadata meta_data.csv --root ../data_set/ecobee --select ProvinceState ON --store fleet.store
+"""
+
+import os
+import json
+
+import numpy as np
+
+from . import metadata as md
+from . import preprocessing as pp
+
+storeVersion = 1
+
+# files of the indexes and their types
+indexFiles = {'runDevice': ('runs/device.bin', np.int32),
+              'runRow':    ('runs/row.bin', np.int64),
+              'runDay':    ('runs/day.bin', np.int64),
+              'dayOrdinal': ('days/ordinal.bin', np.int32),
+              'dayRow':     ('days/row.bin', np.int64)}
+
+def codeType(n):
+    '''
+    Description: It returns the type of the codes of a categorical column with n categories (the one pandas uses).
+    '''
+    for dtype in [np.int8, np.int16, np.int32]:
+        if n < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+class fleetStore:
+
+    def __init__(self, path, mode = 'r'):
+        '''
+        Description: It opens a store.
+        Input:
+            path: The store directory.
+            mode: 'r' to read it, or 'a' to read and add reports to it (it is created if it doesn't exist).
+        '''
+        if mode not in ('r', 'a'):
+            raise ValueError("mode should be 'r' or 'a', not '%s'" % mode)
+        self.path = path
+        self.mode = mode
+        self.maps = dict()
+        self.runsOf = None
+        
+        metaPath = os.path.join(path, 'store.json')
+        if os.path.exists(metaPath):
+            with open(metaPath) as file:
+                self.meta = json.load(file)
+            if self.meta['version'] != storeVersion:
+                raise ValueError('%s has version %d of the store, not %d' % (path, self.meta['version'], storeVersion))
+        elif mode == 'a':
+            self.meta = {'version': storeVersion, 'rows': 0, 'days': 0, 'runs': 0,
+                         'columns': [], 'devices': [], 'sources': []}
+            for sub in ['columns', 'runs', 'days']:
+                os.makedirs(os.path.join(path, sub), exist_ok=True)
+            self.commit()
+        else:
+            raise FileNotFoundError('no store at %s' % path)
+        
+        self.deviceCodes = {device: code for code, device in enumerate(self.meta['devices'])}
+        self.sources = set(self.meta['sources'])
+        if mode == 'a':
+            self.removeUnused()
+            self.truncate()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        if self.mode == 'a' and exc[0] is None:
+            self.commit()
+        self.close()
+    
+    def close(self):
+        '''
+        Description: It drops the memory maps. Arrays already returned stay valid.
+        '''
+        self.maps = dict()
+    
+    @property
+    def devices(self):
+        '''
+        Description: The devices in the store, in the order they were added.
+        '''
+        return list(self.meta['devices'])
+    
+    @property
+    def columns(self):
+        '''
+        Description: The names of the columns of the store.
+        '''
+        return [column['name'] for column in self.meta['columns']]
+    
+    def __contains__(self, device):
+        return device in self.deviceCodes
+    
+    def __len__(self):
+        return self.meta['rows']
+    
+    def columnFile(self, column):
+        return os.path.join(self.path, 'columns', column['file'])
+    
+    def files(self):
+        '''
+        Description: It returns a list of (file path, type, committed length) of every file of the store.
+        '''
+        files = [(self.columnFile(c), np.dtype(c['dtype']), self.meta['rows']) for c in self.meta['columns']]
+        lengths = {'run': self.meta['runs'], 'day': self.meta['days']}
+        for name, (file, dtype) in indexFiles.items():
+            files.append((os.path.join(self.path, file), np.dtype(dtype), lengths[name[:3]]))
+        return files
+    
+    def truncate(self):
+        '''
+        Description: It cuts every file to its committed length, dropping what a writer left after its last commit.
+        '''
+        for path, dtype, length in self.files():
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            if os.path.getsize(path) != length * dtype.itemsize:
+                with open(path, 'r+b') as file:
+                    file.truncate(length * dtype.itemsize)
+    
+    def array(self, path, dtype, length):
+        '''
+        Description: It returns a read only memory map of the first length items of a file.
+        '''
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        key = (path, length)
+        if key not in self.maps:
+            self.maps[key] = np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+        return self.maps[key]
+    
+    def index(self, name):
+        '''
+        Description: It returns an index array (a key of indexFiles) as a memory map.
+        '''
+        file, dtype = indexFiles[name]
+        length = self.meta['runs'] if name.startswith('run') else self.meta['days']
+        return self.array(os.path.join(self.path, file), dtype, length)
+    
+    def column(self, name):
+        '''
+        Description:
+            It returns the whole column of the store as a memory map: datetime64[s] for DateTime,
+            the codes for the categorical columns and the values for the others.
+        '''
+        column = self.meta['columns'][self.columns.index(name)]
+        values = self.array(self.columnFile(column), np.dtype(column['dtype']), self.meta['rows'])
+        if column['kind'] == 'datetime':
+            return values.view('datetime64[s]')
+        return values
+    
+    def deviceRuns(self, device):
+        '''
+        Description: It returns the indices of the runs of a device, in the order they were added (chronological).
+        '''
+        if self.runsOf is None:
+            devices = np.asarray(self.index('runDevice'))
+            order = np.argsort(devices, kind='stable')
+            bounds = np.flatnonzero(np.r_[True, devices[order][1:] != devices[order][:-1], True])
+            self.runsOf = {int(devices[order[a]]): order[a:b] for a, b in zip(bounds[:-1], bounds[1:])}
+        if device not in self.deviceCodes:
+            raise KeyError('device %s is not in the store' % device)
+        return self.runsOf.get(self.deviceCodes[device], np.empty(0, dtype=np.int64))
+    
+    
+    def runBounds(self, run):
+        '''
+        Description: It returns the rows and the day entries of a run as (first row, stop row, first day, stop day).
+        '''
+        runRow, runDay = self.index('runRow'), self.index('runDay')
+        if run + 1 < self.meta['runs']:
+            return int(runRow[run]), int(runRow[run + 1]), int(runDay[run]), int(runDay[run + 1])
+        return int(runRow[run]), self.meta['rows'], int(runDay[run]), self.meta['days']
+    
+    def lastDay(self, device):
+        '''
+        Description: It returns the ordinal of the last day stored for a device, or None if it has none.
+        '''
+        if device not in self.deviceCodes:
+            return None
+        for run in self.deviceRuns(device)[::-1]:
+            first, stop, dayStart, dayStop = self.runBounds(run)
+            if dayStop > dayStart:
+                return int(self.index('dayOrdinal')[dayStop - 1])
+        return None
+    
+    def ranges(self, device, first = None, last = None):
+        '''
+        Description: It finds the rows of a device, or of some of its days, through the indexes.
+        Input:
+            device: The device identifier.
+            first, last: The ordinals of the first and last days wanted ('Days in Order' of getDataFrame,
+                         or datetime.date), or None for the first and last days of the device.
+        Output:
+            A list of tuples (first row, stop row, first day entry, stop day entry), one for each run with
+            rows in the range.
+        '''
+        first = first.toordinal() if hasattr(first, 'toordinal') else first
+        last = last.toordinal() if hasattr(last, 'toordinal') else last
+        
+        dayOrdinal, dayRow = self.index('dayOrdinal'), self.index('dayRow')
+        ranges = list()
+        for run in self.deviceRuns(device):
+            runStart, runStop, dayStart, dayStop = self.runBounds(run)
+            ordinals = dayOrdinal[dayStart:dayStop]
+            
+            a = dayStart + (int(np.searchsorted(ordinals, first)) if first is not None else 0)
+            b = dayStart + (int(np.searchsorted(ordinals, last, side='right')) if last is not None else len(ordinals))
+            if a < b:
+                ranges.append((int(dayRow[a]), int(dayRow[b]) if b < dayStop else runStop, a, b))
+        return ranges
+    
+    def ordinals(self, ranges):
+        '''
+        Description: It returns the ordinal of the day of each row of some ranges (see ranges).
+        '''
+        dayOrdinal, dayRow = self.index('dayOrdinal'), self.index('dayRow')
+        days = [np.repeat(dayOrdinal[c:d], np.diff(np.r_[dayRow[c:d], b])) for a, b, c, d in ranges]
+        return np.concatenate(days + [np.empty(0, dtype=np.int32)])
+    
+    def frame(self, device, first = None, last = None):
+        '''
+        Description:
+            It returns the rows of a device as a data frame in the compact layout of ecobeeData, with
+            'Days in Order' counted from 1 on its first day like ecobeeData.append does. If the rows are
+            in a single run, the columns are memory maps of the store (except 'Days in Order'), otherwise
+            the runs are copied together.
+        Input:
+            device: The device identifier.
+            first, last: The first and last days wanted (see ranges).
+        Output:
+            A pandas data frame.
+        '''
+        import pandas as pd
+        
+        ranges = self.ranges(device, first, last)
+        
+        data = dict()
+        for column in self.meta['columns']:
+            values = self.column(column['name'])
+            if len(ranges) == 1:
+                values = values[ranges[0][0]:ranges[0][1]]
+            else:
+                values = np.concatenate([values[a:b] for a, b, c, d in ranges] + [values[:0]])
+            if column['kind'] == 'category':
+                values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(column['categories']), validate=False)
+            data[column['name']] = values
+        
+        days = self.ordinals(ranges)
+        data[pp.julianDayCol] = (days - (days[0] if len(days) else 0) + 1).astype(np.int32)
+        return pd.DataFrame(data, copy=False)
+    
+    def add(self, device, data, source = None):
+        '''
+        Description:
+            It appends a run with the rows of a report of a device. The rows are sorted by time if they are not,
+            and they are only seen by readers after commit().
+        Input:
+            device: The device identifier.
+            data: A data frame returned by ecobeeData.getDataFrame or compactFrame, with its original
+                  'Days in Order' (the ordinals of the days). Its days must come after the ones stored for the device.
+            source: The report file, kept so the same report is not added twice.
+        Output:
+            The number of rows added.
+        '''
+        if self.mode != 'a':
+            raise ValueError('the store was opened for reading')
+        if source is not None and source in self.sources:
+            return 0
+        
+        data = pp.ecobeeData(cache = False).compactFrame(data)
+        if not data[pp.dateCol].is_monotonic_increasing:
+            data = data.sort_values(pp.dateCol, kind='stable', ignore_index=True)
+        ordinals = data[pp.julianDayCol].to_numpy(dtype=np.int32)
+        rows = len(ordinals)
+        
+        last = self.lastDay(device)
+        if rows and last is not None and ordinals[0] <= last:
+            raise ValueError('%s starts on or before the last day stored for device %s' % (source or 'the report', device))
+        
+        if rows:
+            for name in data.columns:
+                if name != pp.julianDayCol and name not in self.columns:
+                    self.addColumn(name, data[name])
+            for column in self.meta['columns']:
+                self.appendValues(column, data[column['name']] if column['name'] in data.columns else None, rows)
+            
+            if device not in self.deviceCodes:
+                self.deviceCodes[device] = len(self.meta['devices'])
+                self.meta['devices'].append(device)
+            dayStarts = np.flatnonzero(np.r_[True, ordinals[1:] != ordinals[:-1]])
+            self.appendIndex('runDevice', [self.deviceCodes[device]])
+            self.appendIndex('runRow', [self.meta['rows']])
+            self.appendIndex('runDay', [self.meta['days']])
+            self.appendIndex('dayOrdinal', ordinals[dayStarts])
+            self.appendIndex('dayRow', self.meta['rows'] + dayStarts)
+            
+            self.meta['rows'] += rows
+            self.meta['days'] += len(dayStarts)
+            self.meta['runs'] += 1
+            self.runsOf = None
+        
+        if source is not None:
+            self.meta['sources'].append(source)
+            self.sources.add(source)
+        return rows
+    
+    def addColumn(self, name, values):
+        '''
+        Description: It adds a new column to the store, empty for the rows already stored.
+        '''
+        import pandas as pd
+        
+        if pd.api.types.is_datetime64_any_dtype(values):
+            column = {'kind': 'datetime', 'dtype': 'int64'}
+        elif name == pp.timeCol:
+            column = {'kind': 'time', 'dtype': 'int16'}
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            column = {'kind': 'category', 'dtype': codeType(0).name, 'categories': []}
+        else:
+            column = {'kind': 'float', 'dtype': 'float32'}
+        column['name'] = name
+        self.meta['columns'].append(column)
+        self.rewrite(column, self.missing(column, self.meta['rows']))
+    
+    def missing(self, column, rows):
+        '''
+        Description: It returns the values of rows with nothing in a column (NaN, NaT, -1 or no category).
+        '''
+        fill = {'datetime': np.iinfo(np.int64).min, 'time': -1, 'category': -1, 'float': np.nan}[column['kind']]
+        return np.full(rows, fill, dtype=column['dtype'])
+    
+    def rewrite(self, column, values):
+        '''
+        Description: 
+            It replaces the stored values of a column. They are written to a new file, which only store.json
+            points to after commit(), so the committed file is left as it is until then.
+        '''
+        self.meta['files'] = self.meta.get('files', 0) + 1
+        column['file'] = '%d.bin' % self.meta['files']
+        with open(self.columnFile(column), 'wb') as file:
+            np.asarray(values, dtype=column['dtype']).tofile(file)
+        self.maps = dict()
+    
+    def removeUnused(self):
+        '''
+        Description: It removes the column files store.json doesn't point to (replaced, or left by a writer that didn't commit).
+        '''
+        used = {column['file'] for column in self.meta['columns']}
+        directory = os.path.join(self.path, 'columns')
+        for name in os.listdir(directory):
+            if name not in used:
+                os.remove(os.path.join(directory, name))
+    
+    def appendValues(self, column, values, rows):
+        '''
+        Description: It writes the values of a column of a new run at the end of its file.
+        '''
+        import pandas as pd
+        
+        if values is None:
+            values = self.missing(column, rows)
+        elif column['kind'] == 'datetime':
+            values = values.to_numpy().astype('datetime64[s]').view(np.int64)
+        elif column['kind'] == 'time':
+            values = values.to_numpy()
+        elif isinstance(values.dtype, pd.CategoricalDtype) or column['kind'] == 'category':
+            if column['kind'] == 'float':
+                # a text column that was empty in the reports stored before
+                if not np.isnan(self.column(column['name'])).all():
+                    raise ValueError('column %s has numbers and text' % column['name'])
+                column.update({'kind': 'category', 'dtype': codeType(0).name, 'categories': []})
+                self.rewrite(column, self.missing(column, self.meta['rows']))
+            values = self.categoryCodes(column, pd.Categorical(values))
+        else:
+            values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        
+        with open(self.columnFile(column), 'ab') as file:
+            np.asarray(values, dtype=column['dtype']).tofile(file)
+    
+    def categoryCodes(self, column, values):
+        '''
+        Description: 
+            It returns the codes of a categorical in the categories of a column, adding the new ones.
+            The stored codes are widened if the categories don't fit in their type anymore.
+        '''
+        categories = column['categories']
+        known = {category: code for code, category in enumerate(categories)}
+        for category in values.categories:
+            if category not in known:
+                known[category] = len(categories)
+                categories.append(category)
+        mapping = np.asarray([known[category] for category in values.categories] + [-1], dtype=np.int64)
+        
+        dtype = codeType(len(categories))
+        if dtype != np.dtype(column['dtype']):
+            codes = np.fromfile(self.columnFile(column), dtype=column['dtype'], count=self.meta['rows'])
+            column['dtype'] = dtype.name
+            self.rewrite(column, codes)
+        return mapping[values.codes]
+    
+    def appendIndex(self, name, values):
+        '''
+        Description: It writes new entries at the end of an index file.
+        '''
+        file, dtype = indexFiles[name]
+        with open(os.path.join(self.path, file), 'ab') as out:
+            np.asarray(values, dtype=dtype).tofile(out)
+    
+    def commit(self):
+        '''
+        Description: It makes what was added visible, writing store.json atomically.
+        '''
+        path = os.path.join(self.path, 'store.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.meta, file)
+        os.replace(path + '.tmp', path)
+        self.maps = dict()
+        self.removeUnused()
+    
+    def addReports(self, device, paths, cache = True):
+        '''
+        Description: It parses the report files of a device and adds the ones not stored yet, in the order passed.
+        Input:
+            device: The device identifier.
+            paths: The report files, in chronological order.
+            cache: See ecobeeData.
+        Output:
+            A dictionary mapping each file that could not be added to the error.
+        '''
+        failures = dict()
+        for path, data, error in loadReports(device, paths, self.sources, cache)[1]:
+            try:
+                if error is not None:
+                    raise error
+                self.add(device, data, path)
+            except Exception as e:
+                failures[path] = e
+        return failures
+    
+    def repack(self, path):
+        '''
+        Description:
+            It writes a copy of the store to a new directory with a single run for each device, so every
+            device is read without copying.
+        Input:
+            path: The new store directory, which shouldn't exist.
+        Output:
+            The new fleetStore, opened for reading.
+        '''
+        if os.path.exists(path):
+            raise FileExistsError(path)
+        
+        with fleetStore(path, 'a') as new:
+            for device in self.devices:
+                ranges = self.ranges(device)
+                data = self.frame(device)
+                data[pp.julianDayCol] = self.ordinals(ranges)
+                new.add(device, data)
+            new.meta['sources'] = list(self.meta['sources'])
+        return fleetStore(path)
+
+def loadReports(device, paths, skip = (), cache = True):
+    '''
+    Description: It parses the report files of a device for the store. It runs in the worker processes of buildStore.
+    Input:
+        device: The device identifier.
+        paths: The report files.
+        skip: The files already stored, which are not parsed.
+        cache: See ecobeeData.
+    Output:
+        A tuple (device, list of (path, compact data frame or None, exception or None)).
+    '''
+    reports = list()
+    for path in paths:
+        if path not in skip:
+            path, data, error, records = pp.loadReport(path, cache, compact = True)
+            reports.append((path, data, error))
+    return device, reports
+
+def buildStore(devices,
+               root,
+               path,
+               years = None,
+               workers = None,
+               cache = True,
+               fetcher = None,
+               commitEvery = 100,
+               progress = None):
+    '''
+    Description:
+        It adds the reports of many devices to a store, creating it if needed. The reports are parsed in
+        parallel worker processes and written by this one. The reports already stored are skipped, so it
+        can be run again with new years to append them, or to resume a run that was stopped.
+    Input:
+        devices: A list of device identifiers or a data frame selected from metaData.
+        root: The dataset directory, with one directory for each year.
+        path: The store directory.
+        years: The years to look for (see ecobee.fleet.defaultYears).
+        workers: Number of worker processes. If None, it uses one per CPU.
+        cache: See ecobeeData.
+        fetcher: A datasetFetcher to get the report files instead of reading them from root. The files of
+                 a device are fetched when it is about to be parsed.
+        commitEvery: Number of devices added between commits.
+        progress: A function called as progress(done, total, device, error, elapsed) for each
+                  device, or None.
+    Output:
+        A dictionary mapping each report that could not be added to the error message.
+    '''
+    import time
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from .fleet import defaultYears, deviceFiles
+    
+    if years is None:
+        years = defaultYears
+    if isinstance(devices, pd.DataFrame):
+        devices = devices[md.dataIdCol].values
+    devices = list(dict.fromkeys(devices))
+    
+    failures = dict()
+    start = time.time()
+    with fleetStore(path, 'a') as store, ProcessPoolExecutor(workers) as pool:
+        # with a fetcher, the files of a device are downloaded just before it is parsed, so only the devices
+        # parsed ahead are downloaded at a time
+        if fetcher is not None:
+            todo = devices
+        else:
+            paths = {device: deviceFiles(root, device, years) for device in devices}
+            todo = [device for device in devices if any(p not in store.sources for p in paths[device])]
+        
+        def finish(device, errors):
+            nonlocal done
+            done += 1
+            if done % commitEvery == 0:
+                store.commit()
+            if progress is not None:
+                progress(done, len(todo), device, '; '.join(errors) or None, time.time() - start)
+        
+        # keep a few devices parsed ahead, so the parsed data doesn't pile up in memory
+        pending = set()
+        queue = iter(todo)
+        ahead = 2 * (workers or os.cpu_count() or 1)
+        done = 0
+        while True:
+            for device in queue:
+                devicePaths = fetcher.fetchDevice(device, years) if fetcher is not None else paths[device]
+                reports = [p for p in devicePaths if p not in store.sources]
+                if not reports:
+                    finish(device, [])
+                    continue
+                pending.add(pool.submit(loadReports, device, reports, (), cache))
+                if len(pending) >= ahead:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                device, reports = future.result()
+                errors = list()
+                for report, data, error in reports:
+                    try:
+                        if error is not None:
+                            raise error
+                        store.add(device, data, report)
+                    except Exception as e:
+                        failures[report] = '%s: %s' % (type(e).__name__, e)
+                        errors.append(failures[report])
+                finish(device, errors)
+    return failures
+
+def main(argv = None):
+    '''
+    Description: Command line entry point. Run with --help for the options.
+    '''
+    import argparse
+    from .fleet import addSelectionArguments, selectDevices, printProgress
+    
+    parser = argparse.ArgumentParser(description='Pack the reports of many ecobee devices into a memory-mapped store.')
+    addSelectionArguments(parser)
+    parser.add_argument('--store', default='fleet.store', help='store directory, created if it does not exist')
+    args = parser.parse_args(argv)
+    
+    selection, fetcher = selectDevices(parser, args)
+    
+    print('Storing %d devices...' % selection.shape[0])
+    failures = buildStore(selection, args.root, args.store,
+                          years = args.years,
+                          workers = args.workers,
+                          cache = not args.no_cache,
+                          fetcher = fetcher,
+                          progress = printProgress)
+    print('Done! %d reports failed.' % len(failures))
+    for report, error in failures.items():
+        print('%s: %s' % (report, error))
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@ accountFile = 'account'
 #importing libraries
 import ecobee.preprocessing as pp
 import ecobee.metadata as md
+import ecobee.fetcher as ft
 import numpy as np
 
 import os
@@ -18,23 +19,21 @@ import os
 os.chdir(datasetPath)
 metadata = md.metaData("meta_data.csv")
 
-x = metadata.data[metadata.data[md.frstCnctCol] == '00:00.0']
+x = metadata.select(md.frstCnctCol, '00:00.0')
 device = (x[md.dataIdCol].values)[-1] 
-file =  device + '.csv'
 del x
 
 #download data from google cloud
 os.system('gcloud auth login '+ ((os.popen("cat "+ accountFile)).read()).replace('\n',''))
-for year in np.arange(2015,2020,1).astype('str'):
-    os.system('gsutil cp gs://donate_your_data_2019/files/'+year+'/'+file+'.zip '+year)
-    os.system('unzip '+year+'/'+file+'.zip -d ' + year)
+fetcher = ft.datasetFetcher(ft.gcsBackend())
+files = fetcher.fetchDevice(device, np.arange(2015,2020,1))
 
 # get the Data
 ecobee = pp.ecobeeData()
 # generate a data frame from the ecobee csv file
 print('Generating Data Frame...')
-for year in np.arange(2015,2020,1).astype('str'):
-    ecobee.append(year+'/'+file)
+# parse serially, this script has no main guard for worker processes to import it safely
+ecobee.extend(files, workers = 1)
 print('Done!')
 
 # select just the most important data e calculate important parameters like mean, max, and min temperatures
@@ -62,5 +61,5 @@ ecobee.animatedPlotStatic(dataframe = new_df[(new_df[pp.julianDayCol] >= 4) & (n
                          y2label    = "Indoor Humidity",
                          title     = "Comparison Between Outdoor and Indoor Humidity")
 
-deviceInfo = metadata.data.loc[metadata.data[md.dataIdCol] == device]
+deviceInfo = metadata.select(md.dataIdCol, device)
 print(deviceInfo.iloc[0])
\ No newline at end of file
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copies of the code of the first version of this repository, used by the tests as the reference
+the optimized code has to match. ecobeeData keeps only the loading and summary methods, and the
+heatwave functions are the same as they were in climate.heatwaveFinder.
+
+Don't change them, except to keep them running on new versions of their dependencies.
+"""
+
+import numpy as np
+
+from ecobee.preprocessing import dateCol, timeCol, yearCol, monthCol, dayCol, julianDayCol, systemModeCol, \
+                                 outTemCol, inTemCol, inHumCol, outHumCol, timeDeviceOnCol, \
+                                 maxInHumCol, maxInTemCol, maxOutTemCol, outHumColMax, \
+                                 minInHumCol, minInTemCol, minOutTemCol, minOutHumCol, \
+                                 meanInHumCol, meanInTemCol, meanOutTemCol, meanOutHumCol, \
+                                 stdOutTemCol, stdInHumCol, stdInTemCol, stdoutHumCol
+
+class ecobeeData:
+  
+    def __init__(self):
+        '''
+        Description: Initialize object with an empty dataframe.
+        '''
+        
+        import pandas as pd
+        self.data = pd.DataFrame([])
+        self.maxJulianDay = 0
+        self.size = 0
+
+    def append(self, path):
+        '''
+        Description:
+            It receives a file path of an ecobee data as input, gets its dataframe and
+            append it to self.data.
+        Input:
+            datframe: An ecobee data file path.
+        '''
+        import pandas as pd
+        
+        try:
+            newData = self.getDataFrame(path)
+        except FileNotFoundError:
+            return
+        
+        nextMaxJulianDay = newData[julianDayCol].max()
+        new_min = newData[julianDayCol].min()
+        
+        # shift all days in order to make the first day be 1
+        newData[julianDayCol] -= new_min - 1 
+        if self.size > 0:
+            newData[julianDayCol] += self.data[julianDayCol].max() + (new_min - self.maxJulianDay) - 1
+        
+        self.maxJulianDay = nextMaxJulianDay
+        # DataFrame.append was removed from pandas, pd.concat does the same
+        self.data = pd.concat([self.data, newData], ignore_index=True, sort=True)
+        self.size += 1
+ 
+    def getDataFrame(self, path):
+        '''
+        Description: It creates a data frame from a ecobee report csv table and includes new columns as the following:
+          dayCol       = 'Day'
+          yearCol      = 'Year'
+          monthCol     = 'Month'
+          JulianDayCol = 'Days in Order'
+          timeCol      = 'Time'
+          
+        It also converts temperature from fahrenheit to celsius, cast temperatures and humidities from string to numeric, 
+        and calculates 'julian day' for each day.
+          
+        Obs: This function doesn't solve problems like incorrect number of columns or rows. If there is any problem like these, it is needed
+        to treat them before this function call.
+        
+        Input:
+          path: The report file path.
+          
+        Output:
+          A pandas data frame.
+        '''
+        
+        import pandas as pd
+        import numpy as np
+        import datetime as dt
+        
+        try:
+            data = pd.read_csv(path)
+        except pd.errors.ParserError:
+            # just open file and read the data
+            file = open(path, 'r')
+            rawData = file.readlines()
+            file.close()
+          
+            # clean up the data removing empty rows and commentaries
+            i = 0;
+            while i < len(rawData):
+                if '#' in rawData[i] or '\n' == rawData[i] or '' == rawData[i]:
+                    data.pop(i)
+                else:
+                    i+=1
+
+            columns = rawData[0].split(',')
+            try:
+                data = pd.DataFrame([line.split(',') for line in rawData[1:]], columns=columns)
+            except ValueError as e:
+                import sys
+                print(e)
+                sys.exit()
+              
+        data.rename(columns={'RH_out\n':'RH_out'}, inplace=True)
+          
+        #split datetime into date and time columns
+        datetime = np.asarray([d.split(' ') for d in data[dateCol]], dtype='str')
+        data[dateCol] = datetime[:,0]
+        data[timeCol] = datetime[:,1]
+          
+        # get year month and day from Date
+        date = np.asarray([d.split('-') for d in data[dateCol]], dtype='uint16')
+          
+        # create new coluns
+        data[yearCol]  = date[:,0]
+        data[monthCol] = date[:,1]
+        data[dayCol]   = date[:,2]
+        data[julianDayCol] = 0
+          
+        # cast these columns from str to numeric
+        data[outTemCol]  = pd.to_numeric(data[outTemCol], errors='coerce')
+        data[inHumCol]  = pd.to_numeric(data[inHumCol], errors='coerce')
+        data[inTemCol] = pd.to_numeric(data[inTemCol], errors='coerce')
+        data[outHumCol]   = pd.to_numeric(data[outHumCol], errors='coerce')
+          
+        # convert temperature from fahrenheit to celsius
+        data[outTemCol]  = (data[outTemCol]  - 32) * (5/9)
+        data[inTemCol] = (data[inTemCol] - 32) * (5/9)
+        
+        # get Julian Day
+        for date in data[dateCol].unique():
+            d = dt.datetime.strptime(date, "%Y-%m-%d") # get datetime object
+            data.loc[ (data[yearCol] == d.year) & (data[monthCol] == d.month) & (data[dayCol] == d.day), julianDayCol] = dt.date(d.year,d.month,d.day).toordinal()
+        return data
+    
+    def getMaxMin(self, column):
+        '''
+        Description:
+            It computes max and min value of the specified column passed for each day. 
+            It returns a list with the values for each day.
+        Input:
+            column: The name of the column of interest.
+        Output:
+            A list with lists containing max and min value for each day. 
+            As the following example:
+                
+            returning list := [[max1,min1], [max2,min2], ...,[maxN,minN]]
+        '''
+        import numpy as np
+        
+        data = self.data.copy()
+        
+        mxmn_list = list()
+        for day in data[julianDayCol].unique():
+            d = data[data[julianDayCol] == day] 
+            mxmn_list.append([round(np.max(d[column]),2), round(np.min(d[column]),2)])
+        return mxmn_list
+    
+    def getMean(self, column):
+        '''
+        Description:
+            It computes mean and standard deviation of the values from the specified column passed for each day. 
+            It returns a list with the values calculated.
+        Input:
+            column: The name of the column of interest.
+        Output:
+            A list with lists containing mean and stddev for each day. 
+            As the following example:
+
+            returning list := [[mean1,stddev1], [mean2,stddev2], ...,[meanN,stddevN]]
+        '''
+        import numpy as np
+        
+        data = self.data.copy()
+        
+        mean_list = list()
+        for day in data[julianDayCol].unique():
+            d = data[data[julianDayCol] == day]
+            mean_list.append([round(np.mean(d[column]), 2), round(np.std(d[column]), 2)])
+        return mean_list
+    
+    def getTimeOn(self):
+        '''
+        Description:
+            It computes how much time the device that controls temperature was left on mode on. 
+            It returns a list with the values for each day in order.
+
+        Output:
+            A list with each time that the device was left on mode on for each day.
+        '''
+        
+        data = self.data.copy()
+        
+        count_list = list()
+        for day in data[julianDayCol].unique():
+            d = data[data[julianDayCol] == day]
+            modes = d[systemModeCol].values
+            clock = d[timeCol].values
+            clock = [x.split(':') for x in clock]
+            
+            count = 0
+            i = 0
+            while i < len(modes):
+                if modes[i]!= "off":
+                    b = int(clock[i][0])*60 + int(clock[i][1])
+                    i+=1
+                    while i < len(modes) and modes[i]!= "off":
+                        i+=1
+                    if i < len(modes):
+                        a = int(clock[i][0])*60 + int(clock[i][1])
+                    else:
+                        a = 1440
+                        
+                    count += a - b
+                i+=1
+            
+            count_list.append(count)
+        return count_list
+    
+    def summarizeData(self):
+        '''
+        Description:
+            It computes mean, standard deviation, max and min values from Outdoor and Indoor measures. 
+            It returns a new dataframe with these values.
+
+        Output:
+            A simplified data frame containing mean, standard deviation, max, and
+            min values from Indoor and Outdoor Humidity and Temperature.
+        '''
+        import pandas as pd
+        import numpy as np
+        
+        data = self.data.copy()
+        
+        columns= [outTemCol, inTemCol, inHumCol, outHumCol]
+        
+        meanv = list()
+        mxmnv = list()
+        for c in columns:
+            meanv.append(np.asarray(self.getMean(c)))
+            mxmnv.append(np.asarray(self.getMaxMin(c)))
+        
+        tmOn = np.asarray([self.getTimeOn()])
+        days = np.asarray([data[julianDayCol].unique()])
+        
+        meanv = np.concatenate((meanv[:]), axis=1)
+        mxmnv = np.concatenate((mxmnv[:]), axis=1)
+        
+        values = np.concatenate((days.T,meanv,mxmnv,tmOn.T), axis=1)
+        
+        
+        cln_columns = [julianDayCol, 
+                      meanOutTemCol, stdOutTemCol,
+                      meanInTemCol, stdInTemCol,
+                      meanInHumCol, stdInHumCol,
+                      meanOutHumCol, stdoutHumCol,
+                      maxOutTemCol, minOutTemCol,
+                      maxInTemCol, minInTemCol,
+                      maxInHumCol, minInHumCol,
+                      outHumColMax, minOutHumCol,
+                      timeDeviceOnCol]
+        
+        self.summ = pd.DataFrame(values, columns = cln_columns)
+
+def check_shape(data, day, day_name = 'DAY365'):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        day: A dat as an integer.
+        day_name: The name of the column that contains the days.
+    Output:
+        It returns a boolean. It returns True if the number of 
+        the lines of the specified column is more than one and
+        False otherwise.
+    '''
+    if(data[data[day_name] == day].shape[0] == 0):
+        return False
+    else:
+        return True
+    
+def check_2days(data, day, day_name = 'DAY365'):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        day: A dat as an integer.
+        day_name: The name of the column that contains the days.
+    Output:
+        It returns a boolean. It returns True if there are data
+        from 2 days back until the day specified and False otherwise.
+    '''
+    
+    # If there is information in df in the day in question and 2 back as well, then return True, else there is no way to there is a heatwave
+    if((check_shape(data,day,day_name)) & (check_shape(data,day-1, day_name)) & (check_shape(data,day-2, day_name))):
+        return True
+    else:
+        return False
+
+# Function that if "check_2days" is True we check if in these 2 days the definition of heatwave is satisfied
+def init_hw(data,day,index = 'CTX90pct',min_tmp_name = 'MIN_N_AIRTMP_MED10', max_tmp_name = 'MAX_N_AIRTMP_MED10',
+            day_name = 'DAY365'):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        day: the value of the day.
+        min_air_var_name: the name of the column that contains the min_air temperature.
+        max_air_var_name: the name of the column that contains the max_air temperature.
+        min_air_p90: the value of the min temperature that represents the percentil 90 for this day.
+        max_air_p90: the value of the max temperature that represents the percentil 90 for this day.
+    Output:
+        It returns a boolean. It returns True if it was registered tempreratures above the percentil 90
+        from 2 days back until the day specified or from this day until 2 days forward. It returns False otherwise.
+    '''
+    
+    if index == 'CTX90pct':
+        var_names = [max_tmp_name, day_name,'p90_max']
+    if index == 'CTN90pct':
+        var_names = [min_tmp_name, day_name,'p90_min']
+    
+    actual_df = data[data[day_name] == day][var_names]
+    df1_back = data[data[day_name] == day - 1][var_names]
+    df2_back = data[data[day_name] == day - 2][var_names]
+    df1_forward = data[data[day_name] == day + 1][var_names]
+    df2_forward = data[data[day_name] == day + 2][var_names]
+    
+    if(check_2days(data,day, day_name)):
+            
+        
+        c1_b = c2_b = c1_f = c2_f = c3 = False
+        # Defining conditions so that there is or not a heatwave
+        if(index == 'CTN90pct'):
+            if not df1_back.empty:
+                c1_b = np.max(df1_back[min_tmp_name].values) >= df1_back['p90_min'].values[0]
+            if not df2_back.empty:
+                c2_b = np.max(df2_back[min_tmp_name].values) >= df2_back['p90_min'].values[0]
+            if not df1_forward.empty:    
+                c1_f = np.max(df1_forward[min_tmp_name].values) >= df1_forward['p90_min'].values[0]
+            if not df2_forward.empty:
+                c2_f = np.max(df2_forward[min_tmp_name].values) >= df2_forward['p90_min'].values[0]
+            if not actual_df.empty:
+                c3   = np.max(actual_df[min_tmp_name].values) >= actual_df['p90_min'].values[0]
+        elif(index == 'CTX90pct'):
+            if not df1_back.empty:
+                c1_b = np.max(df1_back[max_tmp_name].values) >= df1_back['p90_max'].values[0]
+            if not df2_back.empty:
+                c2_b = np.max(df2_back[max_tmp_name].values) >= df2_back['p90_max'].values[0]
+            if not df1_forward.empty:    
+                c1_f = np.max(df1_forward[max_tmp_name].values) >= df1_forward['p90_max'].values[0]
+            if not df2_forward.empty:
+                c2_f = np.max(df2_forward[max_tmp_name].values) >= df2_forward['p90_max'].values[0]
+            if not actual_df.empty:
+                c3   = np.max(actual_df[max_tmp_name].values) >= actual_df['p90_max'].values[0]
+        else:
+            print('A valid index name is required.')
+            return False
+        
+        #Condition if there are 2 days before now that the temperature exceeds the pth
+        c_b = c1_b & c2_b
+        
+        #Condition if there are 2 days AFTER now that the temperature exceeds the pth
+        c_f = c1_f & c2_f
+        
+        if c3&(c_b | c_f):
+            return True
+        else:
+            return False
+    else:
+        return False
+
+
+def day_percentiles(data, tmp_name, percentile = 90, day_name = 'DAY365'):
+    '''
+    Input:
+        data: Pandas Data Frame Object.
+        tmp_name: The name of the column that contains the temperatures.
+        percentile: the value of the percentile.
+        day_name: The name of the column that contains the days.
+    Output:
+        A dictionary mapping each day to its percentile, computed as the first loop of get_heatwave did.
+    '''
+    df = data
+    pth = dict()
+    for d in df[day_name].unique():
+        # For each day there will be a different pct
+        df_pct = df[(df[day_name] >= d-15) & (df[day_name] <= d + 15)]
+        
+        # organize data to get the percentiles
+        max_t = []
+        for day in df_pct[day_name].unique():
+            mx = df_pct[df_pct[day_name] == day][tmp_name].unique()
+            max_t.append(mx)
+        
+        # get the percentile
+        pth[d] = np.percentile(np.asarray(max_t), percentile)
+    return pth
+
+def label_heatwaves(data, flag, hw_name, index = 'CTX90pct', day_name = 'DAY365', min_tmp_name = None, max_tmp_name = None):
+    '''
+    Input:
+        data: Pandas Data Frame Object with the columns 'p90_max' or 'p90_min'.
+        The other arguments are the same as get_heatwave.
+    Output:
+        A copy of data labeled as the second loop of get_heatwave did.
+    '''
+    df = data.copy()
+    df[flag] = 0
+    df[hw_name] = 0
+    which_heat_wave = 1
+    new_hw = False
+    
+    for d in df[day_name].unique():
+        
+        # verify if it was registered temperatures above the percentils
+        if init_hw(df,d,index = index,max_tmp_name = max_tmp_name, min_tmp_name = min_tmp_name, day_name = day_name):
+            
+            # label the heat wave encountered on the data frame
+            new_hw = True
+            df.loc[(df[day_name] == d) , flag] = 1
+            df.loc[(data[day_name] == d) , hw_name] = which_heat_wave
+        else:
+            if(new_hw == True):
+                which_heat_wave = which_heat_wave + 1
+                new_hw = False
+    return df
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of ecobee.fetcher with a localBackend on a temporary directory laid out like the bucket.
+"""
+
+import os
+import time
+
+import pytest
+
+from ecobee import fetcher as ft
+
+device = '0123456789abcdef'
+
+class countingBackend(ft.localBackend):
+
+    def __init__(self, root, extraBytes = 0):
+        '''
+        Description: A localBackend that counts the downloads and can report a wrong size.
+        '''
+        super().__init__(root)
+        self.extraBytes = extraBytes
+        self.downloads = 0
+    
+    def stat(self, key):
+        size, md5 = super().stat(key)
+        return size + self.extraBytes, md5
+    
+    def download(self, key, dest):
+        self.downloads += 1
+        super().download(key, dest)
+
+@pytest.fixture
+def bucket(tmp_path):
+    '''
+    A bucket with the files of 2015 and 2017 of the device, and none of 2016.
+    '''
+    root = tmp_path / 'bucket'
+    for year in [2015, 2017]:
+        os.makedirs(root / str(year))
+        with open(root / str(year) / (device + '.csv.zip'), 'wb') as file:
+            file.write(('report of %d' % year).encode() * 100)
+    return str(root)
+
+def test_fetchDevice(bucket, tmp_path):
+    backend = countingBackend(bucket)
+    fetcher = ft.datasetFetcher(backend, cacheDir = str(tmp_path / 'cache'), workers = 2)
+    
+    paths = fetcher.fetchDevice(device, years = range(2015, 2018))
+    assert len(paths) == 2
+    assert backend.downloads == 2
+    for path, year in zip(paths, [2015, 2017]):
+        assert path.endswith('.csv.zip')
+        with open(path, 'rb') as file:
+            assert file.read() == ('report of %d' % year).encode() * 100
+    
+    # the second time the files come from the cache
+    assert fetcher.fetchDevice(device, years = range(2015, 2018)) == paths
+    assert backend.downloads == 2
+
+def test_missingYear(bucket, tmp_path):
+    fetcher = ft.datasetFetcher(ft.localBackend(bucket), cacheDir = str(tmp_path / 'cache'))
+    assert fetcher.fetchDevice(device, years = [2016]) == []
+    with pytest.raises(FileNotFoundError):
+        fetcher.fetchOne('2016/%s.csv.zip' % device)
+
+def test_sizeMismatch(bucket, tmp_path, monkeypatch):
+    sleeps = list()
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+    
+    backend = countingBackend(bucket, extraBytes = 1)
+    fetcher = ft.datasetFetcher(backend, cacheDir = str(tmp_path / 'cache'), retries = 2)
+    with pytest.raises(IOError, match = 'expected'):
+        fetcher.fetchOne('2015/%s.csv.zip' % device)
+    assert backend.downloads == 3
+    assert sleeps == [1, 2]
+    
+    # nothing is left in the cache
+    assert os.listdir(tmp_path / 'cache' / 'objects') == []
+    assert not os.path.exists(tmp_path / 'cache' / 'refs')
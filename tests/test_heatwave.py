@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression tests of climate.heatwaveFinder against the first version of the code (tests/baseline.py),
+on synthetic station series.
+"""
+
+import numpy as np
+import pytest
+
+from climate import heatwaveFinder as hwf
+from benchmarks import synthetic
+
+from . import baseline
+
+max_tmp_name = 'MAX_N_AIRTMP_MED10'
+min_tmp_name = 'MIN_N_AIRTMP_MED10'
+
+series = {'plain': dict(years = 1, seed = 0),
+          'gaps':  dict(years = 1, seed = 1, gapFraction = 0.05),
+          'nan':   dict(years = 1, seed = 2, nanFraction = 0.01)}
+
+@pytest.mark.parametrize('name', sorted(series))
+@pytest.mark.parametrize('percentile', [50, 90, 97.5])
+def test_window_percentiles(name, percentile):
+    data = synthetic.stationSeries(**series[name])
+    expected = baseline.day_percentiles(data, max_tmp_name, percentile)
+    actual = hwf.window_percentiles(data, [max_tmp_name, min_tmp_name], [percentile])
+    
+    days = sorted(expected)
+    np.testing.assert_allclose(actual[max_tmp_name][percentile].loc[days].values, [expected[d] for d in days],
+                               rtol = 0, atol = 1e-9)
+    
+    expected = baseline.day_percentiles(data, min_tmp_name, percentile)
+    np.testing.assert_allclose(actual[min_tmp_name][percentile].loc[days].values, [expected[d] for d in days],
+                               rtol = 0, atol = 1e-9)
+
+@pytest.mark.parametrize('name', sorted(series))
+@pytest.mark.parametrize('index', ['CTX90pct', 'CTN90pct'])
+@pytest.mark.parametrize('percentile', [50, 90])
+def test_label_heatwaves(name, index, percentile):
+    data = synthetic.stationSeries(**series[name])
+    tmp_name, pct_name = (max_tmp_name, 'p90_max') if index == 'CTX90pct' else (min_tmp_name, 'p90_min')
+    data[pct_name] = hwf.day_percentiles(data, tmp_name, percentile).loc[data['DAY365']].values
+    
+    expected = baseline.label_heatwaves(data, 'flag', 'hw', index = index,
+                                        min_tmp_name = min_tmp_name, max_tmp_name = max_tmp_name)
+    flags, labels = hwf.label_heatwaves(data, tmp_name, pct_name)
+    assert (flags == expected['flag'].values).all()
+    assert (labels == expected['hw'].values).all()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression tests of ecobee.preprocessing against the first version of the code (tests/baseline.py),
+on small synthetic reports.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import ecobee.preprocessing as pp
+from ecobee.cache import parseCache
+from benchmarks import synthetic
+
+from . import baseline
+
+@pytest.fixture(scope = 'module')
+def reports(tmp_path_factory):
+    '''
+    Three reports of consecutive years, each one starting some days after the end of the previous one.
+    '''
+    directory = tmp_path_factory.mktemp('reports')
+    paths = list()
+    for k, start in enumerate(['2015-11-20', '2016-01-05', '2017-02-01']):
+        path = str(directory / ('report%d.csv' % k))
+        synthetic.ecobeeReport(path, days = 12, start = start, seed = k)
+        paths.append(path)
+    return paths
+
+def baselineData(paths):
+    data = baseline.ecobeeData()
+    for path in paths:
+        data.append(path)
+    return data
+
+def test_getDataFrame(reports):
+    expected = baseline.ecobeeData().getDataFrame(reports[0])
+    actual = pp.ecobeeData(cache = False).getDataFrame(reports[0])
+    pd.testing.assert_frame_equal(actual, expected, check_exact = True)
+
+def test_append(reports):
+    expected = baselineData(reports)
+    data = pp.ecobeeData(cache = False)
+    for path in reports + ['missing.csv']:
+        data.append(path)
+    pd.testing.assert_frame_equal(data.data, expected.data)
+    assert data.maxJulianDay == expected.maxJulianDay
+    assert data.size == expected.size
+
+def test_extend(reports):
+    expected = baselineData(reports)
+    data = pp.ecobeeData(cache = False)
+    data.append(reports[0])
+    failures = data.extend(reports[1:] + ['missing.csv'], workers = 1)
+    assert list(failures) == ['missing.csv']
+    pd.testing.assert_frame_equal(data.data, expected.data)
+    assert data.maxJulianDay == expected.maxJulianDay
+    assert data.size == expected.size
+
+def test_summarizeData(reports):
+    expected = baselineData(reports)
+    expected.summarizeData()
+    data = pp.ecobeeData.fromFiles(reports, workers = 1, cache = False)
+    data.summarizeData()
+    pd.testing.assert_frame_equal(data.summ, expected.summ, check_exact = True)
+    assert data.getMean(pp.outTemCol) == expected.getMean(pp.outTemCol)
+    assert data.getMaxMin(pp.inHumCol) == expected.getMaxMin(pp.inHumCol)
+    assert data.getTimeOn() == expected.getTimeOn()
+
+def test_summarizeDataIncremental(reports):
+    expected = baselineData(reports)
+    expected.summarizeData()
+    data = pp.ecobeeData(cache = False)
+    for path in reports:
+        data.append(path)
+        data.summarizeData(incremental = True)
+    pd.testing.assert_frame_equal(data.summ, expected.summ, check_exact = True)
+
+def test_summarizeDataCompact(reports):
+    expected = baselineData(reports)
+    expected.summarizeData()
+    data = pp.ecobeeData.fromFiles(reports, workers = 1, cache = False, compact = True)
+    data.summarizeData()
+    
+    # the measures are float32, so the rounded values may differ on the last decimal
+    pd.testing.assert_frame_equal(data.summ, expected.summ, check_exact = False, atol = 0.011, rtol = 0)
+    assert data.getTimeOn() == expected.getTimeOn()
+
+def test_summarizeDataCached(reports, tmp_path):
+    expected = baselineData(reports)
+    expected.summarizeData()
+    cache = parseCache(str(tmp_path))
+    if not cache.enabled:
+        pytest.skip('pyarrow is not installed')
+    
+    # the first load fills the cache and the second one reads from it
+    for _ in range(2):
+        data = pp.ecobeeData.fromFiles(reports, workers = 1, cache = cache)
+        data.summarizeData()
+        pd.testing.assert_frame_equal(data.data, expected.data)
+        pd.testing.assert_frame_equal(data.summ, expected.summ, check_exact = True)
+    assert any(name.endswith('.feather') for _, _, names in os.walk(str(tmp_path)) for name in names)
+
+def test_summarizeStream(reports):
+    expected = baselineData(reports)
+    expected.summarizeData()
+    data = pp.ecobeeData(cache = False)
+    data.summarizeStream(reports, chunkSize = 1000)
+    pd.testing.assert_frame_equal(data.summ, expected.summ, check_exact = True)